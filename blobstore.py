@@ -0,0 +1,74 @@
+import os
+import json
+import zlib
+import hashlib
+from datetime import datetime, timezone
+from myutils import atomic_write
+
+
+def normalize(payload: bytes) -> bytes:
+    """
+    Normalize downloaded Kepler data, so that byte-wise different copies of the same
+    data (line endings, trailing whitespace, trailing empty lines) are stored once.
+    """
+    lines = payload.decode('utf-8', errors='replace').splitlines()
+    lines = [line.rstrip() for line in lines]
+    while lines and not lines[-1]:
+        lines.pop()
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def content_digest(payload: bytes) -> str:
+    """SHA-256 hex digest of the normalized payload, which is also the key of its blob."""
+    return hashlib.sha256(normalize(payload)).hexdigest()
+
+
+# Content-addressed blob store
+# ============================
+class BlobStore:
+    def __init__(self, directory: str):
+        """
+        Stores every download once per distinct content, keyed by the SHA-256 digest of
+        its normalized form. A manifest records which blob every (source, fetch time)
+        delivered.
+        :param directory: Store directory, created if missing
+        """
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, 'manifest.jsonl')
+        os.makedirs(directory, exist_ok=True)
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest[2:] + '.z')
+
+    def put(self, payload: bytes, source: str, fetched: datetime = None) -> str:
+        """
+        Store a download and record it in the manifest.
+        :param payload: Downloaded data
+        :param source: Where the data came from, e.g. its URL
+        :param fetched: Time of the download (UTC), defaults to now
+        :return: Digest of the normalized payload
+        """
+        data = normalize(payload)
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write(path, zlib.compress(data, 9))
+
+        entry = {'source': source, 'digest': digest,
+                 'fetched': (fetched or datetime.now(timezone.utc)).isoformat()}
+        with open(self.manifest_path, 'a') as manifest_file:
+            manifest_file.write(json.dumps(entry) + '\n')
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        """Normalized content of a blob."""
+        with open(self._blob_path(digest), 'rb') as blob_file:
+            return zlib.decompress(blob_file.read())
+
+    def manifest(self) -> list:
+        """All manifest entries as dicts with source, digest and fetched, oldest first."""
+        if not os.path.exists(self.manifest_path):
+            return []
+        with open(self.manifest_path, 'r') as manifest_file:
+            return [json.loads(line) for line in manifest_file if line.strip()]
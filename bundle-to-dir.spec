@@ -1,10 +1,19 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
 from PyInstaller.utils.hooks import collect_data_files
 
 datas = [('icon.ico', '.'),
          ('licenses\\*', 'licenses' )]
 datas += collect_data_files('sv_ttk')
 
+# Modules the app never uses, generated by 'python bundle_analysis.py excludes'
+excludes = []
+excludes_path = os.path.join(SPECPATH, 'bundle-excludes.txt')
+if os.path.exists(excludes_path):
+    with open(excludes_path, 'r') as excludes_file:
+        excludes = [line.strip() for line in excludes_file
+                    if line.strip() and not line.lstrip().startswith('#')]
+
 block_cipher = None
 
 a = Analysis(
@@ -16,7 +25,7 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=excludes,
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
@@ -27,7 +36,7 @@ pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
 exe = EXE(
     pyz,
     a.scripts,
-    [],
+    [('O', None, 'OPTION')],
     exclude_binaries=True,
     name='Keplers-Updater',
     debug=False,
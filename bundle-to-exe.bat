@@ -2,4 +2,4 @@
 call "python\scripts\env.bat"  %*
 if not "%WINPYWORKDIR%"=="%WINPYWORKDIR1%" cd %WINPYWORKDIR1%
 
-pyinstaller --clean bundle-to-exe.spec
\ No newline at end of file
+python -O -m PyInstaller --clean bundle-to-exe.spec
\ No newline at end of file
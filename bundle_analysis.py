@@ -0,0 +1,211 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from modulefinder import ModuleFinder
+from startup_benchmark import APP_DIR, BENCHMARK_ENV_VAR, DIR_BUNDLE, EXE_BUNDLE, benchmark
+
+# Exclusion list read by bundle-to-dir.spec and bundle-to-exe.spec
+EXCLUDES_PATH = os.path.join(APP_DIR, 'bundle-excludes.txt')
+
+# Modules the app only imports on demand, e.g. when updating, so a startup run does not
+# load them. Optional ones are skipped if they are not installed.
+RUNTIME_IMPORTS = ('requests', 'webbrowser', 'math', 'json', 'ctypes', 'packaging.version',
+                   'sv_ttk', 'blobstore', 'tle_archive', 'tle_store', 'exporters', 'pass_cache',
+                   'drift', 'passes', 'scheduler', 'tkasync', 'numpy', 'sgp4.api')
+
+# Packages that are never excluded: those loaded without an import statement, e.g. codecs
+# looked up by name while connecting to a server, and those only loaded on code paths a
+# recording run does not take
+KEEP = ('encodings', 'codecs', 'ssl', '_ssl', 'idna', 'unicodedata', 'stringprep', 'certifi',
+        'charset_normalizer', 'chardet', '_strptime', 'nturl2path')
+
+# Settings for the recording run, so that loading them takes the same paths as for users
+RECORD_CFG = "URL: http://www.celestrak.org/NORAD/elements/weather.txt\n" \
+             "AUTO-MODE: False\n" \
+             "LAST-UPDATE: 2022.07.01 - 12:00\n"
+
+# Runs the app until it is idle, imports the on-demand modules and saves all loaded modules
+RECORD_SCRIPT = """
+import sys, json, runpy
+output, runtime_imports = sys.argv[1], json.loads(sys.argv[2])
+sys.path.insert(0, '.')
+runpy.run_path('keplers_updater.py', run_name='__main__')
+for name in runtime_imports:
+    try:
+        __import__(name)
+    except ImportError:
+        pass
+with open(output, 'w') as output_file:
+    json.dump(sorted(sys.modules), output_file)
+"""
+
+
+def top_level(name: str) -> str:
+    return name.split('.', 1)[0]
+
+
+# Module usage
+# ============
+def record_used_modules(python: str = sys.executable, timeout: float = 60) -> set:
+    """
+    Start the app from source in benchmark mode, so it exits once its window is idle,
+    then import the modules it loads on demand.
+    :param python: Interpreter to run the app with, the one that bundles it
+    :param timeout: Seconds to wait for the run
+    :return: Names of all modules that were loaded
+    """
+    with tempfile.TemporaryDirectory(prefix='ku-analysis-') as directory:
+        os.makedirs(os.path.join(directory, 'WXtoImg'))
+        with open(os.path.join(directory, 'WXtoImg', 'kepler-updater.cfg'), 'w') as cfg_file:
+            cfg_file.write(RECORD_CFG)
+        output = os.path.join(directory, 'modules.json')
+        env = dict(os.environ, APPDATA=directory)
+        env[BENCHMARK_ENV_VAR] = os.path.join(directory, 'benchmark.json')
+        subprocess.run([python, '-c', RECORD_SCRIPT, output, json.dumps(RUNTIME_IMPORTS)],
+                       env=env, cwd=APP_DIR, timeout=timeout, check=True)
+        with open(output, 'r') as output_file:
+            return set(json.load(output_file))
+
+
+def find_bundled_modules(script: str = os.path.join(APP_DIR, 'keplers_updater.py')) -> set:
+    """
+    Names of all modules reachable from the import statements of a script, which is
+    roughly what PyInstaller's Analysis collects.
+    """
+    finder = ModuleFinder(path=[APP_DIR] + sys.path)
+    finder.run_script(script)
+    return set(finder.modules) - {'__main__'}
+
+
+def unused_packages(bundled: set, used: set, keep=()) -> list:
+    """
+    Top-level modules and packages that would be bundled, but of which not a single
+    module is used. Only whole packages are excluded, to stay clear of submodules
+    that are imported conditionally.
+    :param bundled: Names of the modules that would be bundled
+    :param used: Names of the modules that were loaded in a run of the app
+    :param keep: Further top-level names to keep in addition to KEEP
+    :return: Sorted names for the excludes of the spec files
+    """
+    used_packages = {top_level(name) for name in used}
+    return sorted({top_level(name) for name in bundled}
+                  - used_packages - set(KEEP) - set(keep) - set(sys.builtin_module_names))
+
+
+def write_excludes(excludes, path: str = EXCLUDES_PATH):
+    with open(path, 'w') as excludes_file:
+        excludes_file.write(f"# Modules excluded from the bundle, generated by bundle_analysis.py\n"
+                            f"# with Python {sys.version.split()[0]} ({sys.executable}).\n"
+                            f"# Delete this file to bundle everything again.\n")
+        for name in excludes:
+            excludes_file.write(f"{name}\n")
+
+
+def read_excludes(path: str = EXCLUDES_PATH) -> list:
+    """Module names of an exclusion list, without comments and empty lines."""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as excludes_file:
+        return [line.strip() for line in excludes_file
+                if line.strip() and not line.lstrip().startswith('#')]
+
+
+# Bundle size and startup
+# =======================
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def measure_bundles(dir_bundle: str = DIR_BUNDLE, exe_bundle: str = EXE_BUNDLE,
+                    runs: int = 10) -> dict:
+    """
+    Size and startup times of the bundles. For the one-file bundle, the time from
+    launch to the start of the script is mostly spent on extracting the bundle.
+    :param dir_bundle: Executable of the folder bundle
+    :param exe_bundle: One-file bundle
+    :param runs: Startup benchmark runs per bundle
+    :return: Dict with the 'size' in bytes and the 'startup' report of each bundle
+    """
+    sizes, targets = {}, {}
+    if os.path.exists(dir_bundle):
+        sizes['one-dir'] = directory_size(os.path.dirname(os.path.abspath(dir_bundle)))
+        targets['one-dir'] = [os.path.abspath(dir_bundle)]
+    if os.path.exists(exe_bundle):
+        sizes['one-file'] = os.path.getsize(exe_bundle)
+        targets['one-file'] = [os.path.abspath(exe_bundle)]
+    return {'size': sizes, 'startup': benchmark(targets, runs) if targets else {},
+            'excludes': read_excludes()}
+
+
+def compare(before: dict, after: dict) -> list:
+    """
+    Savings between two results of measure_bundles().
+    :return: List of (bundle, metric, before, after) tuples, sizes in bytes, times in seconds
+    """
+    rows = []
+    for bundle in sorted(set(before['size']) & set(after['size'])):
+        rows.append((bundle, 'size', before['size'][bundle], after['size'][bundle]))
+        for metric in ('script_start', 'first_paint', 'idle'):
+            old = (before['startup'].get(bundle, {}).get(metric) or {}).get('median')
+            new = (after['startup'].get(bundle, {}).get(metric) or {}).get('median')
+            if old is not None and new is not None:
+                rows.append((bundle, metric, old, new))
+    return rows
+
+
+# Command line
+# ============
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Slim the PyInstaller bundles by excluding modules"
+                                                 " the app never uses.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    excludes_parser = commands.add_parser('excludes', help="record the used modules and write"
+                                                           " the exclusion list for the spec files")
+    excludes_parser.add_argument('--output', default=EXCLUDES_PATH,
+                                 help="exclusion list (default bundle-excludes.txt)")
+    excludes_parser.add_argument('--keep', nargs='*', default=[],
+                                 help="further top-level modules to never exclude")
+
+    measure_parser = commands.add_parser('measure', help="save size and startup of the bundles")
+    measure_parser.add_argument('output', help="JSON file for the measurement")
+    measure_parser.add_argument('--runs', type=int, default=10,
+                                help="startup runs per bundle (default 10)")
+
+    compare_parser = commands.add_parser('compare', help="show the savings between two"
+                                                         " measurements")
+    compare_parser.add_argument('before', help="measurement of the bundles without excludes")
+    compare_parser.add_argument('after', help="measurement of the slimmed bundles")
+    args = parser.parse_args(argv)
+
+    if args.command == 'excludes':
+        used = record_used_modules()
+        bundled = find_bundled_modules()
+        excludes = unused_packages(bundled, used, args.keep)
+        write_excludes(excludes, args.output)
+        print(f"{len(bundled)} modules found, {len(used)} used,"
+              f" {len(excludes)} packages excluded in {args.output}")
+
+    elif args.command == 'measure':
+        with open(args.output, 'w') as output_file:
+            json.dump(measure_bundles(runs=args.runs), output_file, indent=2)
+
+    else:
+        with open(args.before, 'r') as before_file, open(args.after, 'r') as after_file:
+            rows = compare(json.load(before_file), json.load(after_file))
+        for bundle, metric, old, new in rows:
+            if metric == 'size':
+                print(f"{bundle:8} {metric:12} {old / 2 ** 20:8.1f} MB -> {new / 2 ** 20:8.1f} MB"
+                      f"  ({(old - new) / old:+.1%} saved)")
+            else:
+                print(f"{bundle:8} {metric:12} {old * 1e3:8.0f} ms -> {new * 1e3:8.0f} ms"
+                      f"  ({(old - new) * 1e3:+.0f} ms saved)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+import os
+import sys
+import csv
+import json
+import bisect
+import argparse
+from datetime import datetime, timezone
+from passes import Station, satrecs, find_passes
+from solar import classify_passes
+from myutils import is_keplers, parse_keplers
+
+# Settings of Keplers Updater, which may hold satellite priorities
+CFG_PATH = os.path.join(os.getenv('APPDATA') or '', 'WXtoImg', 'kepler-updater.cfg')
+
+# Columns of an exported plan
+PLAN_FIELDS = ['satellite', 'station', 'aos', 'tca', 'los', 'max_elevation', 'lighting',
+               'record', 'conflicts_with']
+
+
+# Interval tree
+# =============
+class IntervalTree:
+    def __init__(self, intervals):
+        """
+        Static centered interval tree over (start, end, item) tuples of closed intervals.
+        :param intervals: Iterable of (start, end, item)
+        """
+        self.root = self._build(list(intervals))
+
+    def _build(self, intervals):
+        if not intervals:
+            return None
+        points = sorted(point for start, end, _ in intervals for point in (start, end))
+        center = points[len(points) // 2]
+        left = [iv for iv in intervals if iv[1] < center]
+        right = [iv for iv in intervals if iv[0] > center]
+        overlapping = [iv for iv in intervals if iv[0] <= center <= iv[1]]
+        return (center,
+                sorted(overlapping, key=lambda iv: iv[0]),  # by start
+                sorted(overlapping, key=lambda iv: iv[1], reverse=True),  # by end, descending
+                self._build(left), self._build(right))
+
+    def overlapping(self, start, end) -> list:
+        """Items of all intervals overlapping [start, end]."""
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            center, by_start, by_end, left, right = node
+            if end < center:
+                for iv in by_start:
+                    if iv[0] > end:
+                        break
+                    found.append(iv[2])
+                stack.append(left)
+            elif start > center:
+                for iv in by_end:
+                    if iv[1] < start:
+                        break
+                    found.append(iv[2])
+                stack.append(right)
+            else:
+                found.extend(iv[2] for iv in by_start)
+                stack.append(left)
+                stack.append(right)
+        return found
+
+
+# Conflict resolution
+# ===================
+def pass_weight(p, priorities: dict = None) -> float:
+    """Value of recording a pass: its maximum elevation times the satellite's priority."""
+    return p.max_elevation * (priorities or {}).get(p.satellite, 1.0)
+
+
+def conflicts(passes) -> dict:
+    """
+    Find overlapping passes.
+    :param passes: Predicted passes
+    :return: Dict mapping each pass to the list of other passes overlapping it
+    """
+    tree = IntervalTree((p.aos, p.los, p) for p in passes)
+    return {p: [q for q in tree.overlapping(p.aos, p.los) if q is not p] for p in passes}
+
+
+def resolve(passes, priorities: dict = None, weight=pass_weight) -> list:
+    """
+    Choose the non-overlapping subset of passes with the largest total weight
+    (weighted interval scheduling).
+    :param passes: Predicted passes
+    :param priorities: Priority factors by satellite name, 1 if missing
+    :param weight: Function of (pass, priorities) returning the value of a pass
+    :return: Chosen passes, sorted by AOS
+    """
+    passes = sorted(passes, key=lambda p: p.los)
+    ends = [p.los for p in passes]
+    best = [0.0] * (len(passes) + 1)  # best[i]: best total weight of the first i passes
+    take = [False] * len(passes)
+    previous = [0] * len(passes)
+    for i, p in enumerate(passes):
+        # Number of passes ending strictly before this one starts
+        previous[i] = bisect.bisect_left(ends, p.aos, 0, i)
+        with_pass = best[previous[i]] + weight(p, priorities)
+        take[i] = with_pass > best[i]
+        best[i + 1] = with_pass if take[i] else best[i]
+
+    chosen = []
+    i = len(passes)
+    while i > 0:
+        if take[i - 1]:
+            chosen.append(passes[i - 1])
+            i = previous[i - 1]
+        else:
+            i -= 1
+    return chosen[::-1]
+
+
+# Export
+# ======
+def export_plan(passes, plan, path: str, lighting: dict = None):
+    """
+    Write all passes with whether they are recorded, and which recorded passes they
+    conflict with, as JSON, or as CSV if the path ends in '.csv'.
+    :param passes: Predicted passes
+    :param plan: Resolved subset of the passes
+    :param path: Output file
+    :param lighting: Lighting class ('day', 'night' or 'terminator') by pass, see
+                     solar.classify_passes()
+    """
+    lighting = lighting or {}
+    recorded = set(plan)
+    overlaps = conflicts(passes)
+    rows = [{'satellite': p.satellite, 'station': p.station, 'aos': p.aos.isoformat(),
+             'tca': p.tca.isoformat(), 'los': p.los.isoformat(),
+             'max_elevation': round(p.max_elevation, 2), 'lighting': lighting.get(p, ''),
+             'record': p in recorded,
+             'conflicts_with': '; '.join(q.satellite for q in overlaps[p] if q in recorded)}
+            for p in sorted(passes, key=lambda p: p.aos)]
+    if path.endswith('.csv'):
+        with open(path, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=PLAN_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, 'w') as json_file:
+            json.dump(rows, json_file, indent=1)
+
+
+def parse_priorities(text: str) -> dict:
+    """Parse 'NOAA 19=2, NOAA 18=1.5' into a dict of priority factors."""
+    priorities = {}
+    for item in text.split(','):
+        if '=' in item:
+            name, value = item.rsplit('=', 1)
+            priorities[name.strip()] = float(value)
+    return priorities
+
+
+def read_priorities(path: str) -> dict:
+    """
+    Read the priority factors of a kepler-updater.cfg, one 'PRIORITY: NOAA 19=2' line per
+    satellite. Lines with an invalid factor are skipped.
+    :return: Dict of priority factors, empty if the file can not be read
+    """
+    priorities = {}
+    try:
+        with open(path, 'r') as cfg_file:
+            for line in cfg_file:
+                option, _, value = line.partition(' ')
+                if option == 'PRIORITY:':
+                    try:
+                        priorities.update(parse_priorities(value))
+                    except ValueError:
+                        pass
+    except OSError:
+        return {}
+    return priorities
+
+
+# Command line
+# ============
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan which passes a single-receiver station"
+                                                 " records when passes overlap.")
+    parser.add_argument('keplers', help="Kepler data file, e.g. weather.txt")
+    parser.add_argument('output', help="output file (.json or .csv)")
+    parser.add_argument('--lat', type=float, required=True, help="station latitude in degrees")
+    parser.add_argument('--lon', type=float, required=True, help="station longitude in degrees")
+    parser.add_argument('--alt', type=float, default=0, help="station altitude in meters")
+    parser.add_argument('--hours', type=float, default=24, help="planning window (default 24)")
+    parser.add_argument('--min-elevation', type=float, default=0,
+                        help="minimum elevation in degrees (default 0)")
+    parser.add_argument('--priorities', default='',
+                        help="priority factors, e.g. 'NOAA 19=2, NOAA 18=1.5', override"
+                             " those of the cfg file (default 1)")
+    parser.add_argument('--cfg', default=CFG_PATH,
+                        help="kepler-updater.cfg to read PRIORITY lines from"
+                             " (default: the one in the WXtoImg directory)")
+    args = parser.parse_args(argv)
+
+    priorities = read_priorities(args.cfg)
+    try:
+        priorities.update(parse_priorities(args.priorities))
+    except ValueError:
+        parser.error(f"invalid priorities '{args.priorities}'")
+
+    with open(args.keplers, 'r') as keplers_file:
+        data = keplers_file.read()
+    if not is_keplers(data):
+        parser.error(f"{args.keplers} does not contain valid Kepler data")
+
+    station = Station('station', args.lat, args.lon, args.alt)
+    tles = parse_keplers(data)
+    start = datetime.now(timezone.utc)
+    passes = [p for (name, _, _), sat in zip(tles, satrecs(tles))
+              for p in find_passes(sat, name, station, start, args.hours, args.min_elevation)]
+    lighting = {light.pass_: light.lighting for light in classify_passes(tles, station, passes)}
+    export_plan(passes, resolve(passes, priorities), args.output, lighting)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import sys
+import csv
+import argparse
+from collections import defaultdict
+from datetime import datetime, timezone
+import numpy as np
+from passes import Station, satrecs, find_passes, teme_to_ecef, teme_to_ecef_velocity, \
+    station_ecef
+from myutils import is_keplers, parse_keplers
+
+SPEED_OF_LIGHT = 299792.458  # km/s
+
+# APT downlink frequencies (Hz)
+APT_FREQUENCIES = {'NOAA 15': 137.62e6, 'NOAA 18': 137.9125e6, 'NOAA 19': 137.1e6}
+DEFAULT_FREQUENCY = 137.5e6
+
+# Record layout of a Doppler table
+DOPPLER_DTYPE = np.dtype([('satellite', 'U24'), ('time', 'f8'), ('range', 'f4'),
+                          ('range_rate', 'f4'), ('frequency', 'f8'), ('doppler', 'f4')])
+
+
+# Doppler tables
+# ==============
+def pass_times(passes, rate: float = 1.0):
+    """
+    Sample times of all passes as one array of unix timestamps.
+    :param passes: Passes of one satellite
+    :param rate: Samples per second
+    """
+    grids = [np.arange(p.aos.timestamp(), p.los.timestamp(), 1 / rate) for p in passes]
+    return np.concatenate(grids) if grids else np.empty(0)
+
+
+def doppler_table(sat, name: str, station: Station, passes, rate: float = 1.0,
+                  frequency: float = None) -> np.ndarray:
+    """
+    Range, range-rate and Doppler shift of a satellite over all of its passes,
+    propagated in a single vectorized call.
+    :param sat: Satellite record
+    :param name: Satellite name
+    :param station: Ground station
+    :param passes: Passes of the satellite over the station
+    :param rate: Samples per second
+    :param frequency: Downlink frequency in Hz, defaults to the satellite's APT frequency
+    :return: Array of DOPPLER_DTYPE records
+    """
+    if frequency is None:
+        frequency = APT_FREQUENCIES.get(name, DEFAULT_FREQUENCY)
+    times = pass_times(passes, rate)
+    jd = np.floor(times / 86400) + 2440587.5
+    fr = times / 86400 - np.floor(times / 86400)
+
+    _, r, v = sat.sgp4_array(jd, fr)
+    r_ecef = teme_to_ecef(r, jd, fr)
+    v_ecef = teme_to_ecef_velocity(r_ecef, v, jd, fr)
+    rho = r_ecef - station_ecef(station)
+    rng = np.linalg.norm(rho, axis=1)
+    range_rate = np.einsum('ij,ij->i', rho, v_ecef) / rng
+
+    table = np.empty(len(times), dtype=DOPPLER_DTYPE)
+    table['satellite'] = name
+    table['time'] = times
+    table['range'] = rng
+    table['range_rate'] = range_rate
+    table['frequency'] = frequency
+    table['doppler'] = -frequency * range_rate / SPEED_OF_LIGHT
+    return table
+
+
+def schedule_doppler(tles, station: Station, passes, rate: float = 1.0,
+                     frequencies: dict = None) -> np.ndarray:
+    """
+    Doppler table of a whole pass schedule, with one propagation per satellite.
+    :param tles: List of (name, line 1, line 2) tuples
+    :param station: Ground station
+    :param passes: Predicted passes of any of the satellites over the station
+    :param rate: Samples per second
+    :param frequencies: Downlink frequencies in Hz by satellite name
+    :return: Array of DOPPLER_DTYPE records, sorted by time
+    """
+    frequencies = dict(APT_FREQUENCIES, **(frequencies or {}))
+    by_satellite = defaultdict(list)
+    for p in passes:
+        by_satellite[p.satellite].append(p)
+
+    tables = [doppler_table(sat, name, station, by_satellite[name], rate,
+                            frequencies.get(name, DEFAULT_FREQUENCY))
+              for (name, _, _), sat in zip(tles, satrecs(tles)) if name in by_satellite]
+    if not tables:
+        return np.empty(0, dtype=DOPPLER_DTYPE)
+    table = np.concatenate(tables)
+    return table[np.argsort(table['time'], kind='stable')]
+
+
+# Export
+# ======
+def export_csv(table: np.ndarray, path: str):
+    """Write a Doppler table as CSV with UTC timestamps."""
+    with open(path, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['satellite', 'time_utc', 'range_km', 'range_rate_km_s',
+                         'frequency_hz', 'doppler_hz'])
+        for row in table:
+            time = datetime.fromtimestamp(row['time'], timezone.utc)
+            writer.writerow([row['satellite'], time.isoformat(timespec='milliseconds'),
+                             f"{row['range']:.3f}", f"{row['range_rate']:.5f}",
+                             f"{row['frequency']:.0f}", f"{row['doppler']:.1f}"])
+
+
+def export_binary(table: np.ndarray, path: str):
+    """Write a Doppler table as a NumPy .npy file of DOPPLER_DTYPE records."""
+    np.save(path, table, allow_pickle=False)
+
+
+# Command line
+# ============
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export Doppler shift tables for all passes"
+                                                 " over a ground station.")
+    parser.add_argument('keplers', help="Kepler data file, e.g. weather.txt")
+    parser.add_argument('output', help="output file (.csv or .npy)")
+    parser.add_argument('--lat', type=float, required=True, help="station latitude in degrees")
+    parser.add_argument('--lon', type=float, required=True, help="station longitude in degrees")
+    parser.add_argument('--alt', type=float, default=0, help="station altitude in meters")
+    parser.add_argument('--hours', type=float, default=24, help="prediction window (default 24)")
+    parser.add_argument('--min-elevation', type=float, default=0,
+                        help="minimum elevation in degrees (default 0)")
+    parser.add_argument('--rate', type=float, default=1, help="samples per second (default 1)")
+    parser.add_argument('--format', choices=('csv', 'npy'), default=None,
+                        help="output format (default: from the file extension)")
+    args = parser.parse_args(argv)
+
+    with open(args.keplers, 'r') as keplers_file:
+        data = keplers_file.read()
+    if not is_keplers(data):
+        parser.error(f"{args.keplers} does not contain valid Kepler data")
+
+    station = Station('station', args.lat, args.lon, args.alt)
+    tles = parse_keplers(data)
+    start = datetime.now(timezone.utc)
+    passes = [p for (name, _, _), sat in zip(tles, satrecs(tles))
+              for p in find_passes(sat, name, station, start, args.hours, args.min_elevation)]
+    table = schedule_doppler(tles, station, passes, args.rate)
+
+    fmt = args.format or ('npy' if args.output.endswith('.npy') else 'csv')
+    if fmt == 'npy':
+        export_binary(table, args.output)
+    else:
+        export_csv(table, args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+import json
+import math
+import warnings
+from collections import namedtuple
+from datetime import datetime, timezone
+import numpy as np
+from sgp4.api import SatrecArray
+from passes import satrecs, time_grid, find_passes
+from myutils import parse_keplers
+
+# Analysed time span and resolution
+HOURS = 48
+STEP = 60  # s
+
+# Drift below these limits does not change pass schedules noticeably
+NEGLIGIBLE_KM = 1.0
+NEGLIGIBLE_SECONDS = 1.0
+
+# Divergence between the outgoing and incoming element set of one satellite
+# (maximum distances in km or None if a set could not be propagated at all, e.g. after
+# a decay error, maximum AOS shift in seconds or None without a station)
+Drift = namedtuple('Drift', 'satellite norad max_radial max_along max_cross aos_shift')
+
+
+def norad_id(line1: str) -> str:
+    """NORAD catalog number of an element set."""
+    return line1[2:7].strip()
+
+
+def finite(value):
+    """Value as a float, or None if it is NaN, which JSON can not represent."""
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+# Drift estimation
+# ================
+def estimate_drift(old_data: str, new_data: str, station=None, start: datetime = None,
+                   hours: float = HOURS, step: float = STEP) -> list:
+    """
+    Propagate the outgoing and incoming element sets of every satellite present in both
+    versions of the Kepler data on one time grid, and measure how far they diverge.
+    Distances are split into radial, along-track and cross-track components relative to
+    the incoming orbit.
+    :param old_data: Replaced Kepler data
+    :param new_data: New Kepler data
+    :param station: Ground station for the AOS shift, optional
+    :param start: Start of the analysed span (UTC), defaults to now
+    :param hours: Length of the analysed span
+    :param step: Time step in seconds
+    :return: List of Drift tuples
+    """
+    if start is None:
+        start = datetime.now(timezone.utc)
+    old_sets = {norad_id(line1): (name, line1, line2) for name, line1, line2
+                in parse_keplers(old_data)}
+    pairs = [(old_sets[norad_id(line1)], (name, line1, line2)) for name, line1, line2
+             in parse_keplers(new_data) if norad_id(line1) in old_sets]
+    if not pairs:
+        return []
+
+    # One vectorized propagation for all outgoing and incoming element sets
+    old_tles, new_tles = [old for old, _ in pairs], [new for _, new in pairs]
+    old_sats, new_sats = satrecs(old_tles), satrecs(new_tles)
+    jd, fr, _ = time_grid(start, hours * 3600, step)
+    _, r, v = SatrecArray(old_sats + new_sats).sgp4(jd, fr)
+    r_old, r_new, v_new = r[:len(pairs)], r[len(pairs):], v[len(pairs):]
+
+    # Radial, along-track and cross-track unit vectors of the incoming orbits
+    radial = r_new / np.linalg.norm(r_new, axis=2, keepdims=True)
+    cross = np.cross(r_new, v_new)
+    cross /= np.linalg.norm(cross, axis=2, keepdims=True)
+    along = np.cross(cross, radial)
+
+    # Satellites without a single propagated sample get NaN, see finite()
+    diff = r_old - r_new
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        max_radial = np.nanmax(np.abs(np.einsum('ijk,ijk->ij', diff, radial)), axis=1)
+        max_along = np.nanmax(np.abs(np.einsum('ijk,ijk->ij', diff, along)), axis=1)
+        max_cross = np.nanmax(np.abs(np.einsum('ijk,ijk->ij', diff, cross)), axis=1)
+
+    report = []
+    for i, (_, (name, line1, _)) in enumerate(pairs):
+        aos_shift = None
+        if station is not None:
+            aos_shift = max_aos_shift(find_passes(old_sats[i], name, station, start, hours),
+                                      find_passes(new_sats[i], name, station, start, hours))
+        report.append(Drift(name, norad_id(line1), finite(max_radial[i]), finite(max_along[i]),
+                            finite(max_cross[i]), aos_shift))
+    return report
+
+
+def max_aos_shift(old_passes, new_passes):
+    """
+    Largest AOS difference in seconds between passes of two predictions, matched by
+    closest culmination. Passes that exist in only one prediction are ignored.
+    :return: Shift in seconds, or None if no pass could be matched
+    """
+    shift = None
+    for new in new_passes:
+        if not old_passes:
+            break
+        old = min(old_passes, key=lambda p: abs((p.tca - new.tca).total_seconds()))
+        if abs((old.tca - new.tca).total_seconds()) > (new.los - new.aos).total_seconds():
+            continue
+        delta = abs((old.aos - new.aos).total_seconds())
+        shift = delta if shift is None else max(shift, delta)
+    return shift
+
+
+def is_negligible(drift: Drift, km: float = NEGLIGIBLE_KM,
+                  seconds: float = NEGLIGIBLE_SECONDS) -> bool:
+    """Whether schedules computed from the outgoing element set are still valid."""
+    distances = (drift.max_along, drift.max_cross, drift.max_radial)
+    if None in distances or max(distances) > km:
+        return False
+    return drift.aos_shift is None or drift.aos_shift <= seconds
+
+
+def summarize(report: list) -> dict:
+    """
+    Short summary of a drift report for the status line and the pass scheduler.
+    :return: Dict with the number of compared satellites, the NORAD numbers of those with
+             negligible drift, and the largest distance (km) and AOS shift (s), or None
+    """
+    distances = [d for drift in report for d in (drift.max_radial, drift.max_along, drift.max_cross)
+                 if d is not None]
+    shifts = [drift.aos_shift for drift in report if drift.aos_shift is not None]
+    return {'satellites': len(report),
+            'negligible': [drift.norad for drift in report if is_negligible(drift)],
+            'max_km': max(distances, default=None), 'max_aos_shift': max(shifts, default=None)}
+
+
+def save_report(report: list, path: str):
+    """Write a drift report as JSON."""
+    rows = [dict(drift._asdict(), negligible=is_negligible(drift)) for drift in report]
+    with open(path, 'w') as report_file:
+        json.dump({'created': datetime.now(timezone.utc).isoformat(), 'satellites': rows},
+                  report_file, indent=1)
@@ -0,0 +1,119 @@
+from collections import OrderedDict
+import numpy as np
+from numpy.polynomial import chebyshev
+from passes import teme_to_ecef
+
+# Default segment length, polynomial degree and cache size
+SEGMENT = 600  # s
+DEGREE = 8
+MAX_SEGMENTS = 64
+
+# Default bound of the fitting error
+TOLERANCE = 0.01  # km
+
+
+def split_jd(times):
+    """Split unix timestamps into whole julian days and fractions of day."""
+    days = np.asarray(times, dtype=float) / 86400
+    whole = np.floor(days)
+    return whole + 2440587.5, days - whole
+
+
+# Piecewise Chebyshev ephemeris
+# =============================
+class ChebyshevEphemeris:
+    def __init__(self, sat, segment: float = SEGMENT, degree: int = DEGREE,
+                 max_segments: int = MAX_SEGMENTS, tolerance: float = TOLERANCE):
+        """
+        Earth-fixed satellite positions from Chebyshev polynomials fitted to SGP4 over
+        fixed time segments. Segments are fitted on first use and the least recently
+        used ones are dropped beyond max_segments.
+        :param sat: Satellite record
+        :param segment: Segment length in seconds
+        :param degree: Initial polynomial degree, raised until the tolerance is met
+        :param max_segments: Number of segments kept in memory
+        :param tolerance: Maximum position error of a fit in km
+        """
+        self.sat = sat
+        self.segment = segment
+        self.degree = degree
+        self.max_segments = max_segments
+        self.tolerance = tolerance
+        # segment index -> (coefficient array, coefficients per coordinate, fitting error)
+        self._segments = OrderedDict()
+
+    def _propagate(self, times):
+        jd, fr = split_jd(times)
+        _, r, _ = self.sat.sgp4_array(jd, fr)
+        return teme_to_ecef(r, jd, fr)
+
+    def _fit(self, index):
+        """Fit one segment, raising the degree until the fitting error is within tolerance."""
+        start = index * self.segment
+        degree = self.degree
+        while True:
+            # Fit on Chebyshev nodes, check the error halfway between them
+            n = degree + 1
+            nodes = np.cos(np.pi * (np.arange(n) + 0.5) / n)[::-1]
+            checks = np.cos(np.pi * np.arange(1, n) / n)[::-1]
+            coefficients = chebyshev.chebfit(nodes, self._propagate(self._times(start, nodes)),
+                                             degree)
+            fitted = chebyshev.chebval(checks, coefficients).T
+            error = float(np.max(np.linalg.norm(fitted - self._propagate(
+                self._times(start, checks)), axis=1)))
+            if error <= self.tolerance or degree >= 3 * self.degree:
+                return coefficients, coefficients.T.tolist(), error
+            degree += 2
+
+    def _times(self, start, x):
+        return start + (x + 1) * self.segment / 2
+
+    def _get_segment(self, index):
+        segment = self._segments.get(index)
+        if segment is None:
+            segment = self._segments[index] = self._fit(index)
+            if len(self._segments) > self.max_segments:
+                self._segments.popitem(last=False)
+        else:
+            self._segments.move_to_end(index)
+        return segment
+
+    def error(self, time: float) -> float:
+        """Fitting error in km of the segment covering a unix timestamp."""
+        return self._get_segment(int(time // self.segment))[2]
+
+    def position(self, time: float):
+        """
+        Earth-fixed position of the satellite at one time.
+        :param time: Unix timestamp
+        :return: (x, y, z) in km
+        """
+        index = int(time // self.segment)
+        _, coefficients, _ = self._get_segment(index)
+        x = 2 * (time - index * self.segment) / self.segment - 1
+
+        # Clenshaw recurrence on plain floats, which beats NumPy for a single time
+        x2 = 2 * x
+        position = []
+        for c in coefficients:
+            b1 = b2 = 0.0
+            for ck in c[:0:-1]:
+                b1, b2 = x2 * b1 - b2 + ck, b1
+            position.append(x * b1 - b2 + c[0])
+        return tuple(position)
+
+    def positions(self, times) -> np.ndarray:
+        """
+        Earth-fixed positions of the satellite at many times.
+        :param times: Array of unix timestamps
+        :return: Array of shape (len(times), 3) in km
+        """
+        times = np.asarray(times, dtype=float)
+        indices = np.floor_divide(times, self.segment).astype(np.int64)
+        result = np.empty((len(times), 3))
+        for index in np.unique(indices):
+            mask = indices == index
+            coefficients, _, _ = self._get_segment(int(index))
+            x = 2 * (times[mask] - index * self.segment) / self.segment - 1
+            result[mask] = chebyshev.chebval(x, coefficients).T
+        return result
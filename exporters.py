@@ -0,0 +1,78 @@
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from myutils import write_if_changed
+
+
+# Serializers
+# ===========
+def to_wxtoimg(tles) -> bytes:
+    """WXtoImg weather.txt: 3-line element sets with names padded to 24 characters."""
+    return ''.join(f"{name:<24}\r\n{line1}\r\n{line2}\r\n" for name, line1, line2 in tles).encode()
+
+
+def to_tle(tles) -> bytes:
+    """Plain 3-line TLE file, as imported by gpredict into its .tle cache."""
+    return ''.join(f"{name}\n{line1}\n{line2}\n" for name, line1, line2 in tles).encode()
+
+
+def to_orbitron(tles) -> bytes:
+    """Orbitron TLE file: 3-line element sets with Windows line endings."""
+    return ''.join(f"{name}\r\n{line1}\r\n{line2}\r\n" for name, line1, line2 in tles).encode()
+
+
+def to_satdump(tles) -> bytes:
+    """SatDump JSON: list of objects with name, NORAD number and both lines."""
+    return json.dumps([{'name': name, 'norad': int(line1[2:7]), 'tle1': line1, 'tle2': line2}
+                       for name, line1, line2 in tles], indent=1).encode()
+
+
+FORMATS = {'wxtoimg': to_wxtoimg, 'gpredict': to_tle, 'orbitron': to_orbitron,
+           'satdump': to_satdump}
+
+
+# Multi-target export
+# ===================
+def export_target(path: str, data: bytes) -> str:
+    """
+    Write one export target, skipping it if unchanged.
+    :return: 'written', 'unchanged' or an error message
+    """
+    try:
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        return 'written' if write_if_changed(path, data) else 'unchanged'
+    except OSError as err:
+        return f"error: {err}"
+
+
+def export_all(tles, targets, max_workers: int = 4) -> list:
+    """
+    Write the element sets to all targets in parallel. Each format is serialized once,
+    no matter how many targets use it.
+    :param tles: List of (name, line 1, line 2) tuples
+    :param targets: List of (format, path), with a format from FORMATS
+    :param max_workers: Number of writer threads
+    :return: List of (format, path, result) in the order of the targets
+    """
+    unknown = {fmt for fmt, _ in targets} - set(FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown export formats: {', '.join(sorted(unknown))}")
+
+    serialized = {fmt: FORMATS[fmt](tles) for fmt in {fmt for fmt, _ in targets}}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = [executor.submit(export_target, path, serialized[fmt]) for fmt, path in targets]
+        return [(fmt, path, result.result()) for (fmt, path), result in zip(targets, results)]
+
+
+def fan_out(data: bytes, paths, max_workers: int = 4) -> list:
+    """
+    Write the same data to many files in parallel, skipping files that are unchanged.
+    :param data: File content
+    :param paths: Paths of the files
+    :param max_workers: Number of writer threads
+    :return: List of (path, result) in the order of the paths
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(zip(paths, executor.map(lambda path: export_target(path, data), paths)))
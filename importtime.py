@@ -0,0 +1,86 @@
+import builtins
+import sys
+import time
+import _thread
+
+# Environment variable that enables the import-time report
+ENV_VAR = 'KEPLERS_UPDATER_IMPORTTIME'
+
+_original_import = builtins.__import__
+_start = None
+_records = []  # [thread id, depth, module name, cumulative s, self s], or marks
+_stacks = {}  # thread id -> time spent in nested imports, one entry per open import
+
+
+def _resolve(name, globals, level):
+    """Absolute module name of a possibly relative import."""
+    if not level:
+        return name
+    package = (globals or {}).get('__package__') or ''
+    base = package.rsplit('.', level - 1)[0] if level > 1 else package
+    return f"{base}.{name}" if name else base
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    """builtins.__import__ replacement that times every first import of a module."""
+    module_name = _resolve(name, globals, level)
+    if module_name in sys.modules:
+        # 'from package import submodule' may still load a submodule
+        module = sys.modules[module_name]
+        missing = [item for item in fromlist or ()
+                   if item != '*' and not hasattr(module, item)]
+        if not missing:
+            return _original_import(name, globals, locals, fromlist, level)
+        module_name = ', '.join(f"{module_name}.{item}" for item in missing)
+
+    thread = _thread.get_ident()
+    stack = _stacks.setdefault(thread, [])
+    record = [thread, len(stack), module_name, 0.0, 0.0]
+    _records.append(record)
+    stack.append(0.0)
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        cumulative = time.perf_counter() - start
+        nested = stack.pop()
+        if stack:
+            stack[-1] += cumulative
+        record[3], record[4] = cumulative, cumulative - nested
+
+
+def install():
+    """
+    Start timing imports. Only imports that run after this call are recorded, so it
+    should run before any other import of the program.
+    """
+    global _start
+    if builtins.__import__ is not _timed_import:
+        _start = time.perf_counter()
+        builtins.__import__ = _timed_import
+
+
+def mark(label: str):
+    """Add a labelled point in time, e.g. the first paint of the window, to the report."""
+    if _start is not None:
+        _records.append([_thread.get_ident(), 0, label, time.perf_counter() - _start, None])
+
+
+def write(path: str):
+    """
+    Save the recorded imports in the format of 'python -X importtime', with the
+    imports of every thread listed separately.
+    :param path: Path of the report file
+    """
+    main = _thread.get_ident()
+    threads = [main] + sorted({record[0] for record in _records} - {main})
+    with open(path, 'w') as report_file:
+        for thread in threads:
+            report_file.write(f"# {'main thread' if thread == main else f'thread {thread}'}\n")
+            report_file.write("import time: self [us] | cumulative | imported package\n")
+            for _, depth, name, cumulative, own in (r for r in _records if r[0] == thread):
+                if own is None:
+                    report_file.write(f"# {name} after {cumulative * 1e3:.1f} ms\n")
+                else:
+                    report_file.write(f"import time: {own * 1e6:9.0f} | {cumulative * 1e6:10.0f}"
+                                      f" | {'  ' * depth}{name}\n")
@@ -1,19 +1,37 @@
+import os
+import time
+import importtime
+
+# Start of the script, reported by the startup benchmark
+SCRIPT_START = time.time()
+
+# Record how long every import takes, as soon as possible
+if os.getenv(importtime.ENV_VAR):
+    importtime.install()
+
 import tkinter as tk
 from tkinter import ttk
-import sv_ttk
-import os
 import sys
-import webbrowser as wb
-import requests
-from datetime import datetime
-import math
-from myutils import Popup, resource_path, is_keplers
+import threading
+import queue
+from datetime import datetime, timezone
+from notifications import Notification, NotificationQueue
+from myutils import Popup, resource_path, is_keplers, parse_keplers, atomic_write, peak_rss, \
+    CancelToken, Cancelled, UpdateCoalescer
 
 VERSION = '1.0.1'
 
 WXTOIMG_DIR = os.path.join(os.getenv('APPDATA'), 'WXtoImg')
 CFG_PATH = os.path.join(WXTOIMG_DIR, 'kepler-updater.cfg')
 KEPLER_PATH = os.path.join(WXTOIMG_DIR, 'weather.txt')
+PASS_CACHE_DIR = os.path.join(WXTOIMG_DIR, 'pass-cache')
+DRIFT_REPORT_PATH = os.path.join(WXTOIMG_DIR, 'drift-report.json')
+ARCHIVE_DIR = os.path.join(WXTOIMG_DIR, 'tle-archive')
+TLE_STORE_PATH = os.path.join(WXTOIMG_DIR, 'tle-store.sqlite')
+INSTALL_REPORT_PATH = os.path.join(WXTOIMG_DIR, 'install-report.txt')
+IMPORT_REPORT_PATH = os.path.join(WXTOIMG_DIR, 'import-time.txt')
+STATE_PATH = os.path.join(WXTOIMG_DIR, 'state.json')
+DOWNLOADS_DIR = os.path.join(WXTOIMG_DIR, 'downloads')
 ICON_PATH = 'icon.ico'
 LICENSES_DIR = 'licenses'
 
@@ -21,6 +39,19 @@ URL_DEFAULT = "http://www.celestrak.org/NORAD/elements/weather.txt"
 VERSION_URL = "https://api.github.com/repos/stefan-wr/keplers-updater-for-wxtoimg/releases/latest"
 TIMEOUT = 5
 
+# Interval in which the UI looks for messages of the update worker (ms)
+POLL_INTERVAL = 50
+
+# Minimum time between two redraws of the progress bar (ms)
+UI_UPDATE_INTERVAL = 50
+
+# Size of the chunks the Kepler data is downloaded in, cancellation is checked in between
+DOWNLOAD_CHUNK_SIZE = 16 * 1024
+
+# Environment variable with the path of a startup benchmark result. If it is set, the app
+# saves its startup timings there and exits as soon as the window is idle.
+BENCHMARK_ENV_VAR = 'KEPLERS_UPDATER_BENCHMARK'
+
 time_fmt = "%Y.%m.%d - %H:%M"
 
 # Create WXtoImg directory
@@ -33,6 +64,8 @@ if not os.path.exists(WXTOIMG_DIR):
 class AboutWindow(Popup):
     def __init__(self, master, app):
         """A popup window for an about-dialog, showing links, used software and their licenses."""
+        import webbrowser as wb
+
         Popup.__init__(self, master, title="About", icon=ICON_PATH)
 
         # List of projects with links and licenses that are being used
@@ -107,67 +140,87 @@ class AboutWindow(Popup):
             line_frame.pack(anchor=tk.W)
         main_frame.pack(padx=10, pady=10)
 
-        self.finalize()  # Center windows and add icon
+        self.finalize()  # Add icon
 
 
 # Class for popup dialogs ((error-) messages and update notifications)
 # ====================================================================
 class PopupDialog(Popup):
-    def __init__(self, master, title, msg, err=None, up_url=None):
+    def __init__(self, master):
         """
-        A popup window for (error-) messages.
+        A popup window for (error-) messages. It is built once and reused for every
+        message, see show_message().
         :param master: Root TK element
-        :param title: Window title
-        :param msg: Short, informativ message
-        :param err: Error-mode: Full error message, showed after additional button press
-        :param up_url: Update-mode: Link to download program update from
         """
-        Popup.__init__(self, master, title=title, icon=ICON_PATH)
+        Popup.__init__(self, master, icon=ICON_PATH)
         self.top.minsize(width=370, height=0)
-        self.err = err
-        self.update_url = up_url
+        self.err = None
+        self.update_url = None
 
         # Short message
-        label = ttk.Label(self.top, text=msg, justify=tk.LEFT, wraplength=340)
-        label.pack(side=tk.TOP, anchor=tk.NW, padx=15, pady=15)
+        self.label = ttk.Label(self.top, justify=tk.LEFT, wraplength=340)
+        self.label.pack(side=tk.TOP, anchor=tk.NW, padx=15, pady=15)
 
         # Buttons frame, close button
         buttons_frame = ttk.Frame(self.top)
-        ctn_btn = ttk.Button(buttons_frame, text="Close", command=self.close,
+        ctn_btn = ttk.Button(buttons_frame, text="Close", command=self.hide,
                              style="Accent.TButton")
+        ctn_btn.pack(side=tk.RIGHT, padx=10, pady=5)
+
+        # ERROR-MODE: Button to show the full error message
+        self.show_err_btn = ttk.Button(buttons_frame, text="Show full error message",
+                                       command=self.show_full_err)
+
+        # UPDATE-MODE: Button to open download page of new program update
+        self.upt_btn = ttk.Button(buttons_frame, text="Download new version",
+                                  command=self.open_update_url)
+        buttons_frame.pack(side=tk.BOTTOM, anchor=tk.S, padx=10, pady=10)
+
+        # Full error message, shown after pressing show_err_btn
+        self.full_error_frame = ttk.LabelFrame(self.top, text="Full Error Message")
+        self.full_error_text = tk.Text(self.full_error_frame, width=45, bd=0)
+        self.full_error_text.pack(padx=10, pady=5)
+
+        self.finalize()  # Add icon
+
+    def show_message(self, title, msg, err=None, up_url=None):
+        """
+        Show the popup with a new message.
+        :param title: Window title
+        :param msg: Short, informativ message
+        :param err: Error-mode: Full error message, showed after additional button press
+        :param up_url: Update-mode: Link to download program update from
+        """
+        self.top.title(title)
+        self.label.config(text=msg)
+        self.err = err
+        self.update_url = up_url
 
-        # ERROR-MODE: Add button to show the full error message if one was passed on
+        self.full_error_frame.pack_forget()
+        self.show_err_btn.pack_forget()
+        self.upt_btn.pack_forget()
         if self.err is not None:
-            self.show_err_btn = ttk.Button(buttons_frame, text="Show full error message",
-                                           command=self.show_full_err)
             self.show_err_btn.pack(side=tk.LEFT, padx=5, pady=5)
-            ctn_btn.pack(side=tk.RIGHT, padx=10, pady=5)
-
-        # UPDATE-MODE: Add button to open download page of new program update
         elif self.update_url is not None:
-            self.upt_btn = ttk.Button(buttons_frame, text="Download new version",
-                                      command=lambda url=up_url: wb.open_new(url))
             self.upt_btn.pack(side=tk.LEFT, padx=5, pady=5)
-            ctn_btn.pack(side=tk.RIGHT, padx=10, pady=5)
-
-        # MESSAGE-MODE: Just a message
-        else:
-            ctn_btn.pack(side=tk.RIGHT, padx=10, pady=5)
-        buttons_frame.pack(side=tk.BOTTOM, anchor=tk.S, padx=10, pady=10)
 
-        self.finalize()  # Center windows and add icon
+        self.show()  # Center window and show it
 
     def show_full_err(self):
-        """Add another text label holding the full error message."""
-        self.show_err_btn.destroy()
+        """Show the text label holding the full error message."""
+        import math
 
-        full_error_frame = ttk.LabelFrame(self.top, text="Full Error Message")
-        full_error_text = tk.Text(full_error_frame, width=45, bd=0,
-                                  height=math.ceil(len(str(self.err)) / 45))
-        full_error_text.insert(tk.END, f"{self.err}")
-        full_error_text.config(state=tk.DISABLED)
-        full_error_text.pack(padx=10, pady=5)
-        full_error_frame.pack(padx=15, pady=0)
+        self.show_err_btn.pack_forget()
+        self.full_error_text.config(state=tk.NORMAL, height=math.ceil(len(str(self.err)) / 45))
+        self.full_error_text.delete('1.0', tk.END)
+        self.full_error_text.insert(tk.END, f"{self.err}")
+        self.full_error_text.config(state=tk.DISABLED)
+        self.full_error_frame.pack(padx=15, pady=0)
+
+    def open_update_url(self):
+        import webbrowser as wb
+
+        wb.open_new(self.update_url)
 
 
 # Main App Class
@@ -179,12 +232,62 @@ class App:
         # Time of last update
         self.last_update_time = None
 
+        # Content digest of weather.txt and its modification time (ns) when it was written
+        self.kepler_digest = None
+
+        # Ground station as 'name, lat, lon, alt', and commands to run at AOS and LOS
+        # of its passes. Only set in the cfg file.
+        self.station = None
+        self.hooks = {}
+        self.scheduler = None
+
+        # Also keep all element sets in an SQLite database, only set in the cfg file
+        self.tle_store = False
+
+        # Additional files to export the Kepler data to as [(format, path), ...], and
+        # additional WXtoImg directories to install weather.txt into. Only set in the cfg file.
+        self.exports = []
+        self.target_dirs = []
+
+        # Priority factors of satellites for conflicts.py as {name: factor}, only set in the
+        # cfg file, which is rewritten with every update
+        self.priorities = {}
+
+        # Popup-dialog and about-window, created on first use and then reused
+        self.popup = None
+        self.about = None
+
+        # Notifications shown in the main window instead of a popup, and the pending
+        # after-callback that shows the next one
+        self.notifications = NotificationQueue()
+        self.notification_job = None
+
+        # Seconds spent on loading the theme
+        self.theme_time = None
+
+        # Worker thread running the update pipeline, its messages to the UI, and the
+        # cancellation token of the running update
+        self.worker = None
+        self.messages = queue.Queue()
+        self.token = None
+
+        # Changes to the progress bar, applied together at most every UI_UPDATE_INTERVAL
+        self.ui_updates = UpdateCoalescer(master, UI_UPDATE_INTERVAL)
+
+        # Snapshot of the last update, shown until the next one
+        self.state = None
+
+        # asyncio event loop running next to the mainloop, started on first use
+        self.async_bridge = None
+
         # Define UI variables
         self.url_var = tk.StringVar()
         self.auto_update_var = tk.BooleanVar()
         # self.auto_quit_var = tk.BooleanVar()
-        self.progress_var = tk.IntVar()
+        self.progress_var = tk.DoubleVar()
         self.last_update_var = tk.StringVar()
+        self.status_var = tk.StringVar()
+        self.notification_var = tk.StringVar()
 
         # Initialise UI variables with default values
         self.url_var.set(URL_DEFAULT)
@@ -193,17 +296,41 @@ class App:
         self.progress_var.set(0)
         self.last_update_var.set("never")
 
-        # Load configuration
+        # Load configuration and the status of the last update
         self.load_cfg()
+        self.load_state()
 
         # Build UI & setup window geometry
+        self.setup_theme()
         self.setup_ui()
         self.setup_window()
 
+        # Load the network stack in the background once the window is shown
+        self.master.after_idle(self.prefetch_modules)
+
+        # Benchmark mode: save startup timings and exit after the first paint
+        self.benchmark_path = os.getenv(BENCHMARK_ENV_VAR)
+        if self.benchmark_path:
+            self.first_paint_binding = self.master.bind('<Expose>', self.on_first_paint, add='+')
+
+        # Run hook commands at AOS and LOS of upcoming passes
+        self.start_scheduler()
+
         # Auto update mode
         if self.auto_update_var.get():
             self.master.after(500, self.update_keplers)
 
+    # Load theme
+    # ----------
+    def setup_theme(self):
+        """Apply the light Sun Valley theme and measure how long that takes."""
+        import sv_ttk
+
+        start = time.perf_counter()
+        sv_ttk.set_theme("light")
+        self.theme_time = time.perf_counter() - start
+        importtime.mark("theme loaded")
+
     # Build main UI
     # -------------
     def setup_ui(self):
@@ -260,6 +387,25 @@ class App:
                                            mode="determinate")
         self.progressbar.pack(fill=tk.X, padx=padx, pady=pady * 2)
 
+        # Notification area, only shown while there is a notification
+        # <<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<
+        self.notification_frame = ttk.Frame(self.master_frame)
+
+        self.notification_label = ttk.Label(self.notification_frame, justify=tk.LEFT,
+                                            wraplength=330, textvariable=self.notification_var)
+        self.notification_label.pack(side=tk.LEFT, padx=padx, pady=pady)
+        self.dismiss_btn = ttk.Button(self.notification_frame, text="Dismiss",
+                                      command=self.dismiss_notification)
+        self.dismiss_btn.pack(side=tk.RIGHT, padx=padx, pady=pady)
+        self.details_btn = ttk.Button(self.notification_frame, text="Details",
+                                      command=self.show_notification_details)
+        # >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
+
+        # Status of the last update
+        self.status_label = ttk.Label(self.master_frame, textvariable=self.status_var,
+                                      justify=tk.LEFT, wraplength=480)
+        self.status_label.pack(anchor=tk.W, padx=padx, pady=pady)
+
         # Last-Update Frame
         # <<<<<<<<<<<<<<<<<
         self.last_frame = ttk.Frame(self.master_frame)
@@ -297,25 +443,107 @@ class App:
 
         self.master.iconbitmap(resource_path(ICON_PATH))  # set icon
 
+    # Import modules in the background
+    # --------------------------------
+    def prefetch_modules(self):
+        """
+        Import the modules only needed for updates in a background thread, so the first
+        update does not wait for them. Startup itself does not import them at all.
+        """
+        importtime.mark("first idle")
+        threading.Thread(target=__import__, args=('requests',), daemon=True).start()
+
+    # Startup benchmark
+    # -----------------
+    def on_first_paint(self, event=None):
+        """Note the time of the first paint and finish the benchmark once the window is idle."""
+        self.master.unbind('<Expose>', self.first_paint_binding)
+        first_paint = time.time()
+        self.master.after_idle(lambda: self.finish_benchmark(first_paint))
+
+    def finish_benchmark(self, first_paint: float):
+        """
+        Save the startup timings as JSON and close the app.
+        :param first_paint: Time of the first paint (unix time)
+        """
+        import json
+
+        result = {'script_start': SCRIPT_START, 'first_paint': first_paint, 'idle': time.time(),
+                  'theme': self.theme_time, 'peak_rss': peak_rss()}
+        try:
+            with open(self.benchmark_path, 'w') as result_file:
+                json.dump(result, result_file)
+        finally:
+            self.master.destroy()
+
     # Create a popup-dialog
     # ---------------------
     def show_popup(self, title, msg, err=None, up_url=None):
         """
-        Create and open a popup-dialog.
+        Open the popup-dialog, which is created on first use. It is not modal, so this
+        returns right away.
         :param title: Title of the popup window
         :param msg: Message shown on popup
         :param err: A full error message
         :param up_url: URL for update download
         """
-        popup = PopupDialog(self.master, title, msg, err, up_url)
-        self.master.wait_window(popup.top)
+        if self.popup is None:
+            self.popup = PopupDialog(self.master)
+        self.popup.show_message(title, msg, err, up_url)
 
     # Show the about-window
     # ---------------------
     def show_about(self):
-        """Show an about-window"""
-        about = AboutWindow(self.master, self)
-        self.master.wait_window(about.top)
+        """Show the about-window, which is created on first use."""
+        if self.about is None:
+            self.about = AboutWindow(self.master, self)
+        self.about.show()
+
+    # Show notifications in the main window
+    # -------------------------------------
+    def notify(self, title, msg, err=None, up_url=None):
+        """
+        Show a message in the notification area of the main window, without waiting for
+        the user. Repeated messages are merged into one, and messages that come in quick
+        succession are shown one after the other.
+        :param title: Short title of the message
+        :param msg: Message shown in the notification area
+        :param err: A full error message, shown with the details
+        :param up_url: URL for update download, shown with the details
+        """
+        self.notifications.push(Notification(title, msg, err, up_url))
+        self.show_notification()
+
+    def show_notification(self):
+        """Show the current notification and schedule showing the next one."""
+        notification = self.notifications.advance()
+        if notification is None:
+            self.notification_frame.pack_forget()
+        else:
+            self.notification_var.set(notification.text())
+            self.details_btn.pack_forget()
+            if notification.err is not None or notification.up_url is not None:
+                self.details_btn.pack(side=tk.RIGHT, padx=5, pady=5)
+            self.notification_frame.pack(fill=tk.X, padx=5, pady=5, before=self.status_label)
+
+        if self.notification_job is not None:
+            self.master.after_cancel(self.notification_job)
+            self.notification_job = None
+        wait = self.notifications.wait_time()
+        if wait is not None:
+            self.notification_job = self.master.after(int(wait * 1000) + 1,
+                                                      self.show_notification)
+
+    def show_notification_details(self):
+        """Open the current notification in the popup-dialog."""
+        notification = self.notifications.current
+        if notification is not None:
+            self.show_popup(notification.title, notification.msg, notification.err,
+                            notification.up_url)
+
+    def dismiss_notification(self):
+        self.notifications.dismiss()
+        self.show_notification()
 
     # Reset UI to pre-update state
     # ----------------------------
@@ -324,121 +552,560 @@ class App:
         Reset UI states.
         :param rst_progress: Reset progress bar too
         """
-        self.master.update()
-        self.update_btn.config(state=tk.NORMAL)
+        self.update_btn.config(state=tk.NORMAL, text="Update Kepler Data",
+                               command=self.update_keplers)
         if rst_progress:
             self.set_progress(0)
 
     # Update progress bar
     # -------------------
-    def set_progress(self, level: int):
+    def set_progress(self, level: float):
         """
-        Set progress bar to a certain level.
+        Set progress bar to a certain level. It is redrawn with the next flush of the
+        UI updates, showing only the latest level.
         :param level: Level to set progress bar to
         """
-        self.progress_var.set(level)
-        self.master.update_idletasks()
+        self.ui_updates.set(self.progress_var, level)
 
     # Update Kepler Data
     # ------------------
     def update_keplers(self):
-        """Download Kepler data from URL and save it into WXTOIMG directory."""
-        self.update_btn.config(state=tk.DISABLED)
+        """
+        Download Kepler data from URL and save it into WXTOIMG directory. The download
+        runs in a worker thread, so the window stays responsive and the update can be
+        cancelled.
+        """
+        if self.token is not None:
+            return
+        if self.worker is not None and self.worker.is_alive():
+            msg = "The previous update is still finishing. Please try again in a moment."
+            self.notify("Update Running", msg)
+            return
+
+        self.token = CancelToken()
+        self.update_btn.config(text="Cancel", command=self.cancel_update)
         self.set_progress(1)
 
+        self.worker = threading.Thread(target=self.run_update,
+                                       args=(self.url_var.get(), self.token), daemon=True)
+        self.worker.start()
+        self.master.after(POLL_INTERVAL, self.poll_messages, self.token)
+
+    # Cancel the running update
+    # -------------------------
+    def cancel_update(self):
+        """
+        Cancel the running update. The worker stops at its next check, without
+        touching weather.txt, and its remaining messages are ignored. Once the update
+        was committed, it can not be cancelled anymore.
+        """
+        if self.token is None or not self.token.cancel():
+            return
+        self.token = None
+        self.reset_ui()
+
+    # Process messages of the update worker
+    # -------------------------------------
+    def post(self, token: CancelToken, kind: str, *args):
+        """
+        Send a message from the update worker to the UI.
+        :param token: Cancellation token of the update that sends the message
+        :param kind: 'progress' (level, may be fractional), 'committed' (the update can not
+                     be cancelled anymore), 'warning' (title, msg, err) about a part of a
+                     committed update, 'error' (title, msg, err) or 'done' (digest, state)
+        """
+        self.messages.put((token, kind, *args))
+
+    def poll_messages(self, token: CancelToken):
+        """
+        Apply all messages the update worker posted so far, until it is done.
+        :param token: Cancellation token of the update, polling stops once it is not
+                      the running update anymore
+        """
+        while token is self.token:
+            try:
+                message_token, kind, *args = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if message_token is not self.token:
+                continue  # left over from a cancelled update
+
+            if kind == 'progress':
+                self.set_progress(*args)
+            elif kind == 'committed':
+                self.update_btn.config(state=tk.DISABLED)
+            elif kind == 'warning':
+                self.notify(*args)
+            elif kind == 'error':
+                self.token = None
+                self.notify(*args)
+                self.reset_ui()
+            elif kind == 'done':
+                self.token = None
+                self.finish_update(*args)
+
+        if token is self.token:
+            self.master.after(POLL_INTERVAL, self.poll_messages, token)
+
+    def finish_update(self, kepler_digest, state):
+        """
+        Apply the results of a successful update.
+        :param kepler_digest: Digest and modification time of a newly written weather.txt
+        :param state: Snapshot of the update, or None if it could not be saved
+        """
+        from state import status_text
+
+        if kepler_digest is not None:
+            self.kepler_digest = kepler_digest
+        if state is not None:
+            self.state = state
+            self.status_var.set(status_text(state))
+
+        # Set last-update time
+        self.last_update_time = datetime.now()
+        self.set_last_update_var()
+
+        # Save settings
+        self.save_cfg()
+
+        # Reset UI, but leave progressbar at finished state, indicating successful update
+        self.reset_ui(rst_progress=False)
+
+    # Update pipeline
+    # ---------------
+    def run_update(self, url: str, token: CancelToken):
+        """
+        Run the update pipeline in the worker thread. Neither this nor anything it calls
+        may touch Tk, all results go through the message queue.
+        :param url: URL to download the Kepler data from
+        :param token: Cancellation token of this update
+        """
+        try:
+            self.update_pipeline(url, token)
+        except Cancelled:
+            return  # the UI was already reset by cancel_update()
+        except Exception as err:
+            msg = "An unexpected error occurred while updating the Kepler data."
+            self.post(token, 'error', "Unexpected Error", msg, err)
+
+    def update_pipeline(self, url: str, token: CancelToken):
+        """
+        Download Kepler data from URL and save it into WXTOIMG directory. Cancellation is
+        checked between all steps and download chunks, up to replacing weather.txt. From
+        then on, or if weather.txt is unchanged, the update is committed and completes.
+        :param url: URL to download the Kepler data from
+        :param token: Cancellation token of this update
+        """
+        import requests
+        from blobstore import content_digest
+
         # Check HTML status code and the content-type of the response
         # head of the URL before actually downloading the file.
+        timings = {}
         try:
-            head = requests.head(self.url_var.get(), timeout=TIMEOUT, allow_redirects=True)
+            start = time.perf_counter()
+            head = requests.head(url, timeout=TIMEOUT, allow_redirects=True)
+            timings['head'] = time.perf_counter() - start
             if not head.status_code == 200:
                 msg = f"Final status code {head.status_code} is not 200"
-                self.show_popup(title="Error - Status Code", msg=msg)
-                self.reset_ui()
+                self.post(token, 'error', "Error - Status Code", msg, None)
                 return
             if not 'text/plain' in head.headers.get('content-type'):
                 msg = "Content-type of the requested URL does not match the expected type" \
                       " 'text/plain'. Please use a different URL or reset it to default."
-                self.show_popup(title="Error - Content-Type", msg=msg)
-                self.reset_ui()
+                self.post(token, 'error', "Error - Content-Type", msg, None)
                 return
 
         except requests.exceptions.Timeout as err:
             msg = f"The connection to the requested URL timed out after {TIMEOUT} seconds."
-            self.show_popup(title="Timeout Error", msg=msg, err=err)
-            self.reset_ui()
+            self.post(token, 'error', "Timeout Error", msg, err)
             return
 
         except (requests.exceptions.ConnectionError, requests.exceptions.InvalidSchema,
                 requests.exceptions.MissingSchema) as err:
             msg = "Can not connect to the requested URL." \
                   " Please check the URL for typos and / or test it using your browser."
-            self.show_popup(title="Connection Error", msg=msg, err=err)
-            self.reset_ui()
+            self.post(token, 'error', "Connection Error", msg, err)
             return
 
         except Exception as err:
             msg = "An unexpected error occurred while trying to connect to the specified URL."
-            self.show_popup(title="Unexpected Error", msg=msg, err=err)
-            self.reset_ui()
+            self.post(token, 'error', "Unexpected Error", msg, err)
             return
 
-        self.set_progress(2)
+        token.check()
+        self.post(token, 'progress', 2)
 
         # Download Keplers after successful pre-checks
         try:
-            response = requests.get(self.url_var.get(), timeout=TIMEOUT, allow_redirects=True)
+            start = time.perf_counter()
+            content, encoding = self.download(url, token)
+            text = content.decode(encoding or 'utf-8', errors='replace')
+            timings['get'] = time.perf_counter() - start
+            timings['bytes'] = len(content)
+
+        except Cancelled:
+            raise
 
         except requests.exceptions.Timeout as err:
             msg = f"The connection to the requested URL timed out after {TIMEOUT} seconds."
-            self.show_popup(title="Timeout Error", msg=msg, err=err)
-            self.reset_ui()
+            self.post(token, 'error', "Timeout Error", msg, err)
             return
 
         except requests.exceptions.ConnectionError as err:
             msg = "Can not connect to the requested URL."
-            self.show_popup(title="Connection Error", msg=msg, err=err)
-            self.reset_ui()
+            self.post(token, 'error', "Connection Error", msg, err)
             return
 
         except Exception as err:
             msg = "An unexpected error occurred while trying" \
                   " to download Kepler data from  the specified URL."
-            self.show_popup(title="Unexpected Error", msg=msg, err=err)
-            self.reset_ui()
+            self.post(token, 'error', "Unexpected Error", msg, err)
             return
 
-        self.set_progress(3)
+        self.post(token, 'progress', 3)
 
         # Check wether the downloaded data is indeed Kepler data
-        if not is_keplers(response.text):
+        if not is_keplers(text):
             msg = "Either the data is not formatted correctly, or one of" \
                   " the NOAA satellites (15, 18, 19) is missing in the data."
-            self.show_popup(title="Data Error", msg=msg)
-            self.reset_ui()
+            self.post(token, 'error', "Data Error", msg, None)
             return
 
-        # Save Kepler data in to weather.txt file in WXTOIMG directory
+        token.check()
+
+        # Keep the download in the content-addressed store
+        self.store_download(content, url)
+
+        # Save Kepler data in to weather.txt file in WXTOIMG directory, unless the file already
+        # holds the same data. Differences in line endings or whitespace do not count.
+        new_digest = content_digest(content)
+        kepler_digest = None
+        kepler_result = 'unchanged'
+        drift = None
+        if new_digest != self.current_kepler_digest():
+            kepler_result = 'written'
+
+            # Keep the replaced Kepler data to invalidate outdated cached passes
+            try:
+                with open(KEPLER_PATH, 'r') as keplers_file:
+                    old_keplers = keplers_file.read()
+            except OSError:
+                old_keplers = None
+
+            # Last chance to cancel, the token is committed right before weather.txt is replaced
+            try:
+                atomic_write(KEPLER_PATH, content, token)
+                kepler_digest = (new_digest, os.stat(KEPLER_PATH).st_mtime_ns)
+
+            except Cancelled:
+                raise
+            except (OSError, Exception) as err:
+                msg = f"Could not save Kepler data at ({KEPLER_PATH})."
+                self.post(token, 'error', "Error Saving", msg, err)
+                return
+            self.post(token, 'committed')
+
+            self.archive_keplers(text)
+            if self.tle_store:
+                self.store_keplers(text, url)
+            if old_keplers is not None:
+                self.invalidate_pass_cache(old_keplers, text)
+                drift = self.analyse_drift(old_keplers, text)
+            if self.scheduler is not None:
+                # Planned passes of satellites with negligible drift stay valid
+                negligible = drift['negligible'] if drift else ()
+                self.scheduler.update_elements(text, negligible=negligible)
+        else:
+            token.commit()
+            self.post(token, 'committed')
+
+        # Install the Kepler data into additional WXtoImg directories. The update is
+        # committed, so failed directories are only reported.
+        if self.target_dirs:
+            self.install_to_targets(content, kepler_result, token)
+
+        # Write the Kepler data to other tools' files, failed files are only reported
+        if self.exports:
+            self.export_keplers(text, token)
+
+        self.post(token, 'progress', 4)
+
+        # Keep the status of this update for the next start
+        state = self.save_state(text, new_digest, timings, url, drift)
+        self.post(token, 'done', kepler_digest, state)
+
+    # Streamed download
+    # -----------------
+    def download(self, url: str, token: CancelToken):
+        """
+        Download a file in chunks, checking for cancellation between them. The progress
+        bar moves from level 2 to 3 with the received bytes, if the server sends the size.
+        :param url: URL of the file
+        :param token: Cancellation token
+        :return: (content, text encoding given by the server or None)
+        """
+        import requests
+
+        with requests.get(url, timeout=TIMEOUT, allow_redirects=True, stream=True) as response:
+            size = int(response.headers.get('Content-Length') or 0)
+            chunks, received = [], 0
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                token.check()
+                chunks.append(chunk)
+                received += len(chunk)
+                if size:
+                    self.post(token, 'progress', 2 + min(received / size, 1))
+            return b''.join(chunks), response.encoding
+
+    # Load the status of the last update
+    # ---------------------------------
+    def load_state(self):
+        """Show the status saved by the last update, without touching the network."""
+        from state import load_state, status_text
+
+        self.state = load_state(STATE_PATH)
+        if self.state is not None:
+            self.status_var.set(status_text(self.state))
+        importtime.mark("state loaded")
+
+    # Save the status of this update
+    # ------------------------------
+    def save_state(self, data: str, digest: str, timings: dict, source: str, drift: dict = None):
+        """
+        Save a snapshot of this update, which the next start shows right away.
+        :param data: New Kepler data
+        :param digest: Content digest of the downloaded data, see blobstore.content_digest()
+        :param timings: Durations of the update steps and the downloaded bytes
+        :param source: URL the data was downloaded from
+        :param drift: Summary of the drift since the replaced data, optional
+        :return: The snapshot, or None if it could not be created
+        """
+        from state import build_state, save_state
+
+        try:
+            state = build_state(data, source, digest, timings, self.upcoming_passes(data),
+                                drift=drift)
+            save_state(STATE_PATH, state)
+        except (OSError, Exception):
+            return None
+        return state
+
+    # Predict the next passes
+    # -----------------------
+    def upcoming_passes(self, data: str) -> list:
+        """
+        Passes over the ground station within the next 24 hours, from the pass cache for
+        satellites whose Kepler data did not change. Pass prediction is optional, so there
+        are none if its packages are missing or no station is set.
+        :param data: Kepler data
+        """
+        if self.station is None:
+            return []
         try:
-            with open(KEPLER_PATH, 'wb') as keplers_file:
-                keplers_file.write(response.content)
+            from passes import parse_station, satrecs
+            from pass_cache import PassCache
+        except ImportError:
+            return []
+        try:
+            station = parse_station(self.station)
+            tles = parse_keplers(data)
+            cache = PassCache(PASS_CACHE_DIR)
+            start = datetime.now(timezone.utc)
+            return [p for (name, line1, line2), sat in zip(tles, satrecs(tles))
+                    for p in cache.passes(sat, name, line1, line2, station, start)]
+        except (ValueError, Exception):
+            return []
+
+    # Digest of the current Kepler data file
+    # -------------------------------------
+    def current_kepler_digest(self):
+        """
+        Digest of weather.txt, see blobstore.content_digest(). The stored digest is used
+        while the file was not modified since it was written, otherwise the file is hashed.
+        :return: Hex digest, or None if there is no readable weather.txt
+        """
+        from blobstore import content_digest
 
-        except (OSError, Exception) as err:
-            msg = f"Could not save Kepler data at ({KEPLER_PATH})."
-            self.show_popup(title="Error Saving", msg=msg, err=err)
-            self.reset_ui()
+        try:
+            mtime = os.stat(KEPLER_PATH).st_mtime_ns
+            if self.kepler_digest is not None and self.kepler_digest[1] == mtime:
+                return self.kepler_digest[0]
+            with open(KEPLER_PATH, 'rb') as keplers_file:
+                return content_digest(keplers_file.read())
+        except OSError:
+            return None
+
+    # Store downloaded data
+    # ---------------------
+    def store_download(self, content: bytes, source: str):
+        """
+        Add a validated download to the content-addressed store in the WXTOIMG directory,
+        which keeps identical downloads only once.
+        :param content: Downloaded Kepler data
+        :param source: URL the data was downloaded from
+        """
+        from blobstore import BlobStore
+
+        try:
+            BlobStore(DOWNLOADS_DIR).put(content, source=source)
+        except (OSError, Exception):
             return
 
-        self.set_progress(4)
+    # Archive Kepler data
+    # -------------------
+    def archive_keplers(self, data: str):
+        """
+        Add new element sets to the TLE history archive in the WXTOIMG directory.
+        :param data: New Kepler data
+        """
+        from tle_archive import TleArchive
 
-        # Set last-update time
-        self.last_update_time = datetime.now()
-        self.set_last_update_var()
+        try:
+            TleArchive(ARCHIVE_DIR).append(data)
+        except (OSError, Exception):
+            return
 
-        # Save settings
-        self.save_cfg()
+    # Install Kepler data into additional WXtoImg directories
+    # ------------------------------------------------------
+    def install_to_targets(self, content: bytes, kepler_result: str, token: CancelToken):
+        """
+        Write weather.txt into all additional WXtoImg directories in parallel and save a
+        report with the result of every directory. Failed directories are posted as a
+        warning, they do not fail the update.
+        :param content: Downloaded Kepler data
+        :param kepler_result: Result of writing weather.txt in the WXTOIMG directory
+        :param token: Cancellation token of the update, to post warnings with
+        """
+        from exporters import fan_out
 
-        # Reset UI, but leave progressbar at finished state, indicating successful update
-        self.reset_ui(rst_progress=False)
+        paths = [os.path.join(directory, 'weather.txt') for directory in self.target_dirs]
+        results = [(KEPLER_PATH, kepler_result)] + fan_out(content, paths)
+        try:
+            with open(INSTALL_REPORT_PATH, 'w') as report_file:
+                report_file.write(f"{datetime.strftime(datetime.now(), time_fmt)}\n")
+                for path, result in results:
+                    report_file.write(f"{path}: {result}\n")
+        except OSError:
+            pass
+
+        failed = [f"{path}: {result}" for path, result in results
+                  if result not in ('written', 'unchanged')]
+        if failed:
+            msg = "Could not install Kepler data into all configured WXtoImg directories."
+            self.post(token, 'warning', "Error Saving", msg, "\n".join(failed))
+
+    # Export Kepler data to other formats
+    # ----------------------------------
+    def export_keplers(self, data: str, token: CancelToken):
+        """
+        Write the Kepler data to all configured export targets. Failures are posted as a
+        warning, they do not fail the committed update.
+        :param data: New Kepler data
+        :param token: Cancellation token of the update, to post warnings with
+        """
+        from exporters import export_all
+
+        try:
+            results = export_all(parse_keplers(data), self.exports)
+        except (ValueError, Exception) as err:
+            self.post(token, 'warning', "Error Exporting", "Could not export Kepler data.", err)
+            return
+
+        failed = [f"{path}: {result}" for _, path, result in results
+                  if result not in ('written', 'unchanged')]
+        if failed:
+            msg = "Could not export Kepler data to all configured files."
+            self.post(token, 'warning', "Error Exporting", msg, "\n".join(failed))
+
+    # Store Kepler data in SQLite
+    # ---------------------------
+    def store_keplers(self, data: str, source: str):
+        """
+        Insert the element sets into the SQLite TLE store in the WXTOIMG directory.
+        :param data: New Kepler data
+        :param source: URL the data was downloaded from
+        """
+        from tle_store import TleStore
+
+        try:
+            store = TleStore(TLE_STORE_PATH)
+            try:
+                store.ingest(data, source=source)
+            finally:
+                store.close()
+        except (OSError, Exception):
+            return
+
+    # Invalidate cached passes of changed satellites
+    # ---------------------------------------------
+    def invalidate_pass_cache(self, old_data: str, new_data: str):
+        """
+        Drop cached pass tables of satellites whose Kepler data changed.
+        Pass prediction is optional, so nothing happens if its packages are missing.
+        :param old_data: Replaced Kepler data
+        :param new_data: New Kepler data
+        """
+        if not os.path.isdir(PASS_CACHE_DIR):
+            return
+        try:
+            from pass_cache import PassCache
+        except ImportError:
+            return
+        try:
+            PassCache(PASS_CACHE_DIR).invalidate_changed(old_data, new_data)
+        except (OSError, Exception):
+            return
+
+    # Estimate drift between old and new Kepler data
+    # ----------------------------------------------
+    def analyse_drift(self, old_data: str, new_data: str):
+        """
+        Save a report of how far the old and new Kepler data diverge over the next days.
+        Includes the shift of AOS times if a ground station is configured. Pass prediction
+        is optional, so nothing happens if its packages are missing.
+        :param old_data: Replaced Kepler data
+        :param new_data: New Kepler data
+        :return: Summary of the report, see drift.summarize(), or None
+        """
+        try:
+            from drift import estimate_drift, save_report, summarize
+            from passes import parse_station
+        except ImportError:
+            return None
+        try:
+            station = parse_station(self.station) if self.station is not None else None
+            report = estimate_drift(old_data, new_data, station)
+            save_report(report, DRIFT_REPORT_PATH)
+        except (OSError, Exception):
+            return None
+        return summarize(report)
+
+    # Start the pass event scheduler
+    # ------------------------------
+    def start_scheduler(self):
+        """
+        Start running the AOS and LOS hook commands for the passes in the current Kepler
+        data, if a ground station and at least one hook are configured. Pass prediction
+        is optional, so nothing happens if its packages are missing.
+        """
+        if self.station is None or not self.hooks or not os.path.exists(KEPLER_PATH):
+            return
+        try:
+            from scheduler import PassScheduler
+            from passes import parse_station
+            from pass_cache import PassCache
+        except ImportError:
+            return
+        try:
+            with open(KEPLER_PATH, 'r') as keplers_file:
+                data = keplers_file.read()
+            self.scheduler = PassScheduler(parse_station(self.station), hooks=self.hooks,
+                                           cache=PassCache(PASS_CACHE_DIR))
+            self.scheduler.update_elements(data)
+            self.scheduler.start()
+        except (OSError, Exception):
+            self.scheduler = None
 
     # Update the 'last-update' label
     # ------------------------------
@@ -469,6 +1136,20 @@ class App:
             cfg_file.write(f"URL: {self.url_var.get()}\n")
             cfg_file.write(f"AUTO-MODE: {self.auto_update_var.get()}\n")
             cfg_file.write(f"LAST-UPDATE: {datetime.strftime(self.last_update_time, time_fmt)}\n")
+            if self.kepler_digest is not None:
+                cfg_file.write(f"KEPLER-DIGEST: {self.kepler_digest[0]} {self.kepler_digest[1]}\n")
+            if self.station is not None:
+                cfg_file.write(f"STATION: {self.station}\n")
+            if self.tle_store:
+                cfg_file.write("TLE-STORE: True\n")
+            for directory in self.target_dirs:
+                cfg_file.write(f"TARGET-DIR: {directory}\n")
+            for fmt, path in self.exports:
+                cfg_file.write(f"EXPORT: {fmt} {path}\n")
+            for kind, command in self.hooks.items():
+                cfg_file.write(f"{kind}-HOOK: {command}\n")
+            for name, factor in self.priorities.items():
+                cfg_file.write(f"PRIORITY: {name}={factor:g}\n")
             cfg_file.close()
         except (OSError, Exception):
             return
@@ -486,7 +1167,10 @@ class App:
 
             # Read cfg file
             for line in cfg_file:
-                option, value = line.split(maxsplit=1)
+                fields = line.split(maxsplit=1)
+                if len(fields) != 2:
+                    continue  # Blank line or option without a value
+                option, value = fields
                 value = value.rstrip('\n')
 
                 # Kepler data URL
@@ -509,22 +1193,91 @@ class App:
                         pass
                     else:
                         self.set_last_update_var()
+
+                # Digest and modification time of weather.txt when it was written
+                elif option == 'KEPLER-DIGEST:':
+                    try:
+                        digest, mtime = value.split()
+                        self.kepler_digest = (digest, int(mtime))
+                    except ValueError:
+                        pass
+
+                # Ground station for pass prediction
+                elif option == 'STATION:':
+                    self.station = value
+
+                # SQLite TLE store enabled?
+                elif option == 'TLE-STORE:':
+                    self.tle_store = value == 'True'
+
+                # Additional WXtoImg directory
+                elif option == 'TARGET-DIR:':
+                    self.target_dirs.append(value)
+
+                # Additional export target
+                elif option == 'EXPORT:':
+                    fields = value.split(maxsplit=1)
+                    if len(fields) == 2:
+                        self.exports.append((fields[0], fields[1]))
+
+                # Commands to run at AOS and LOS
+                elif option in ('AOS-HOOK:', 'LOS-HOOK:'):
+                    self.hooks[option[:3]] = value
+
+                # Priority factor of a satellite, e.g. 'NOAA 19=2'
+                elif option == 'PRIORITY:':
+                    name, _, factor = value.rpartition('=')
+                    try:
+                        self.priorities[name.strip()] = float(factor)
+                    except ValueError:
+                        pass
             cfg_file.close()
 
+    # Run a coroutine next to the mainloop
+    # ------------------------------------
+    def run_async(self, coro, callback=None, errback=None):
+        """
+        Run a coroutine on the asyncio event loop, which is started on first use.
+        :param coro: Coroutine object, which must not touch Tk
+        :param callback: Called in the mainloop with the result of the coroutine
+        :param errback: Called in the mainloop with the exception the coroutine raised
+        :return: Future of the coroutine
+        """
+        if self.async_bridge is None:
+            from tkasync import AsyncBridge
+            self.async_bridge = AsyncBridge(self.master, POLL_INTERVAL)
+        return self.async_bridge.run(coro, callback, errback)
+
     # Check for program update
     # ------------------------
     def check_for_update(self):
-        """Check for an updated version of this program"""
-        try:
-            response = requests.get(VERSION_URL, timeout=TIMEOUT, allow_redirects=True).json()
-            latest_version = response["tag_name"][1:]
-            latest_url = response["html_url"]
-        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError, Exception):
-            self.show_popup(title="Error", msg="Checking for software update failed.")
-            return
+        """Check for an updated version of this program, without blocking the window."""
+        self.run_async(self.fetch_latest_release(), self.show_update_result,
+                       lambda err: self.show_popup(title="Error",
+                                                   msg="Checking for software update failed."))
 
+    @staticmethod
+    async def fetch_latest_release():
+        """
+        Look up the latest release on GitHub.
+        :return: Version and URL of the latest release
+        """
+        import requests
+        from tkasync import run_blocking
+
+        response = await run_blocking(requests.get, VERSION_URL, timeout=TIMEOUT,
+                                      allow_redirects=True)
+        response = response.json()
+        return response["tag_name"][1:], response["html_url"]
+
+    def show_update_result(self, release):
+        """
+        Tell whether the latest release is newer than this program.
+        :param release: Version and URL of the latest release
+        """
         from packaging import version
 
+        latest_version, latest_url = release
         if version.parse(latest_version) > version.parse(VERSION):
             msg = f"A new version (v{latest_version} > v{VERSION})" \
                   f" of 'Keplers Updater for WXtoImg' is available!"
@@ -539,9 +1292,12 @@ class App:
 if __name__ == '__main__':
     window = tk.Tk()  # create root window
     window.resizable(False, False)  # disable resizing
-    sv_ttk.set_theme("light")  # set theme
     window.title("Keplers Updater for WXtoImg")  # set window title
 
     app = App(window)  # create UI
     window.mainloop()
+
+    # Save the import-time report
+    if os.getenv(importtime.ENV_VAR):
+        importtime.write(IMPORT_REPORT_PATH)
 # =================================================================================================
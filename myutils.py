@@ -1,6 +1,13 @@
 import tkinter as tk
 import os.path
 import sys
+import hashlib
+import time
+import tempfile
+import threading
+
+# Size of the chunks atomic_write() writes between cancellation checks
+WRITE_CHUNK_SIZE = 1 << 20
 
 
 def resource_path(relative_path):
@@ -17,34 +24,237 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
+def file_digest(path: str):
+    """
+    SHA-256 hex digest of a file's content.
+    :param path: Path of the file
+    :return: Digest, or None if the file can not be read
+    """
+    try:
+        with open(path, 'rb') as file:
+            return hashlib.sha256(file.read()).hexdigest()
+    except OSError:
+        return None
+
+
+class Cancelled(Exception):
+    """Raised by CancelToken.check() after the operation was cancelled."""
+
+
+class CancelToken:
+    def __init__(self):
+        """
+        Lets one thread ask an operation running in another thread to stop. The
+        operation calls check() between its steps, and commit() at the point after
+        which it always runs to completion.
+        """
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._committed = False
+
+    def cancel(self) -> bool:
+        """
+        Ask the operation to stop.
+        :return: Whether it was cancelled, False if it was committed already
+        """
+        with self._lock:
+            if not self._committed:
+                self._cancelled = True
+            return self._cancelled
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled
+
+    def check(self):
+        """Raise Cancelled if the operation was cancelled."""
+        if self._cancelled:
+            raise Cancelled()
+
+    def commit(self):
+        """
+        Make the operation uncancellable from now on.
+        :raises Cancelled: If it was cancelled before
+        """
+        with self._lock:
+            self.check()
+            self._committed = True
+
+
+def atomic_write(path: str, data: bytes, token: CancelToken = None):
+    """
+    Replace a file without ever leaving it partially written: the data goes into a
+    temporary file in the same directory, is flushed to disk, and then renamed over
+    the target.
+    :param path: Path of the file
+    :param data: New content
+    :param token: Cancellation token, checked between chunks. A cancelled write
+                  removes the temporary file and leaves the target untouched. The token
+                  is committed right before the target is replaced.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            if token is None:
+                tmp_file.write(data)
+            else:
+                for i in range(0, len(data), WRITE_CHUNK_SIZE):
+                    token.check()
+                    tmp_file.write(data[i:i + WRITE_CHUNK_SIZE])
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        if token is not None:
+            token.commit()
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_if_changed(path: str, data: bytes) -> bool:
+    """
+    Atomically replace a file, unless it already holds exactly the given data.
+    :param path: Path of the file
+    :param data: New content
+    :return: Whether the file was written
+    """
+    if file_digest(path) == hashlib.sha256(data).hexdigest():
+        return False
+    atomic_write(path, data)
+    return True
+
+
+def peak_rss():
+    """
+    Peak resident memory of this process.
+    :return: Size in bytes, or None if it can not be determined
+    """
+    try:
+        if sys.platform == 'win32':
+            import ctypes
+            from ctypes import wintypes
+
+            class ProcessMemoryCounters(ctypes.Structure):
+                _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                            ('PeakWorkingSetSize', ctypes.c_size_t),
+                            ('WorkingSetSize', ctypes.c_size_t),
+                            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                            ('PagefileUsage', ctypes.c_size_t),
+                            ('PeakPagefileUsage', ctypes.c_size_t)]
+
+            counters = ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            process = ctypes.windll.kernel32.GetCurrentProcess()
+            if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters),
+                                                            counters.cb):
+                return None
+            return counters.PeakWorkingSetSize
+
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024  # bytes on macOS, else KiB
+    except (OSError, ImportError, AttributeError):
+        return None
+
+
 class Popup:
     def __init__(self, master, title="", icon=None):
-        """An empty, non-resizable popup window
+        """An empty, non-resizable popup window. It is built hidden and can be shown and
+        hidden again any number of times, so its widgets are only created once.
         :param master: Parent window
         :param title: Popup windows title
         :param icon: Popup window icon
         """
         self.master = master
         self.top = tk.Toplevel(master)
+        self.top.withdraw()
         self.top.title(title)
         self.top.resizable(False, False)
+        self.top.protocol("WM_DELETE_WINDOW", self.hide)
         self.icon = icon
 
     def finalize(self):
-        """Center popup window on its parent window and set the title icon."""
+        """Set the title icon, once all widgets were added."""
+        if self.icon is not None:
+            self.top.iconbitmap(resource_path(self.icon))
+
+    def show(self):
+        """Center popup window on its parent window and show it."""
         self.top.update_idletasks()
-        w, h = self.top.winfo_width(), self.top.winfo_height()
+        w = max(self.top.winfo_reqwidth(), self.top.minsize()[0])
+        h = max(self.top.winfo_reqheight(), self.top.minsize()[1])
         x = int(self.master.winfo_x() + (self.master.winfo_width() / 2 - w / 2))
         y = int(self.master.winfo_y() + (self.master.winfo_height() / 2 - h / 2))
         self.top.geometry(f"+{x}+{y}")
 
-        if self.icon is not None:
-            self.top.iconbitmap(resource_path(self.icon))
+        self.top.deiconify()
+        self.top.lift()
+        self.top.focus_set()
+
+    def hide(self):
+        self.top.withdraw()
 
     def close(self):
         self.top.destroy()
 
 
+class UpdateCoalescer:
+    def __init__(self, master, interval: int = 50):
+        """
+        Collects changes to the UI and applies them together, at most once per interval,
+        through a single after-callback. A change replaces a pending one with the same key,
+        so the drawing cost does not depend on how often changes come in.
+        :param master: Root TK element
+        :param interval: Minimum time between two flushes (ms)
+        """
+        self.master = master
+        self.interval = interval
+        self.pending = {}
+        self.job = None
+        self.last_flush = None
+
+    def call(self, key, function, *args):
+        """
+        Call a function with the next flush.
+        :param key: Identifies the change, only the latest call per key is made
+        :param function: Function that applies the change
+        """
+        self.pending[key] = (function, args)
+        if self.job is None:
+            delay = 0
+            if self.last_flush is not None:
+                elapsed = (time.perf_counter() - self.last_flush) * 1000
+                delay = max(0, int(self.interval - elapsed))
+            self.job = self.master.after(delay, self._on_timer)
+
+    def set(self, variable, value):
+        """Set a Tk variable with the next flush."""
+        self.call(str(variable), variable.set, value)
+
+    def flush(self):
+        """Apply all pending changes right away."""
+        if self.job is not None:
+            self.master.after_cancel(self.job)
+            self.job = None
+        self._apply()
+
+    def _on_timer(self):
+        self.job = None
+        self._apply()
+
+    def _apply(self):
+        pending, self.pending = self.pending, {}
+        for function, args in pending.values():
+            function(*args)
+        self.last_flush = time.perf_counter()
+
+
 def is_keplers(data: str) -> bool:
     """
     Test wether data is correct Kepler data by checking the
@@ -78,3 +288,14 @@ def is_keplers(data: str) -> bool:
         return False
 
     return True
+
+
+def parse_keplers(data: str) -> list:
+    """
+    Split Kepler data into its element sets. Expects data that passed is_keplers().
+    :param data: Kepler data in the 3-line TLE format
+    :return: List of (name, line 1, line 2) tuples
+    """
+    data_lines = data.splitlines()
+    return [(data_lines[i].rstrip(), data_lines[i + 1], data_lines[i + 2])
+            for i in range(0, len(data_lines) - 2, 3)]
@@ -0,0 +1,108 @@
+import time
+
+# Notifications with the same title and message within this many seconds are merged into one
+COALESCE_WINDOW = 60
+
+# Seconds a notification is shown at least, before a queued one replaces it
+MIN_DISPLAY_TIME = 4
+
+# Notifications waiting to be shown, the oldest ones are dropped beyond this
+MAX_PENDING = 10
+
+
+class Notification:
+    def __init__(self, title: str, msg: str, err=None, up_url: str = None, now: float = None):
+        """
+        A message shown in the notification area of the main window.
+        :param title: Short title, e.g. "Error - Timeout"
+        :param msg: Short, informative message
+        :param err: Full error message, shown on demand
+        :param up_url: Link to download a program update from
+        :param now: Time of the notification (time.monotonic())
+        """
+        self.title = title
+        self.msg = msg
+        self.err = err
+        self.up_url = up_url
+        self.count = 1
+        self.last = time.monotonic() if now is None else now
+
+    @property
+    def key(self):
+        return self.title, self.msg
+
+    def merge(self, other):
+        """Count a repetition of this notification, keeping the details of the latest one."""
+        self.count += other.count
+        self.last = other.last
+        self.err = other.err if other.err is not None else self.err
+        self.up_url = other.up_url if other.up_url is not None else self.up_url
+
+    def text(self) -> str:
+        text = f"{self.title}: {self.msg}"
+        if self.count > 1:
+            text += f" ({self.count}×)"
+        return text
+
+
+# Queue of notifications
+# ======================
+class NotificationQueue:
+    def __init__(self, coalesce_window: float = COALESCE_WINDOW,
+                 min_display_time: float = MIN_DISPLAY_TIME, max_pending: int = MAX_PENDING):
+        """
+        Notifications to show one at a time, without waiting for the user. Repeated
+        notifications are merged into one with a count, a shown notification is replaced
+        by the next one no sooner than min_display_time, and stays until it is dismissed
+        if there is no next one.
+        :param coalesce_window: Seconds in which equal notifications are merged
+        :param min_display_time: Seconds a notification is shown at least
+        :param max_pending: Number of waiting notifications, beyond which the oldest are dropped
+        """
+        self.coalesce_window = coalesce_window
+        self.min_display_time = min_display_time
+        self.max_pending = max_pending
+        self.current = None
+        self.shown_at = None
+        self.pending = []
+
+    def push(self, notification: Notification):
+        """Add a notification, or merge it into an equal one that is shown or waiting."""
+        for queued in [self.current] + self.pending:
+            if queued is not None and queued.key == notification.key \
+                    and notification.last - queued.last <= self.coalesce_window:
+                queued.merge(notification)
+                return
+
+        self.pending.append(notification)
+        del self.pending[:-self.max_pending]
+
+    def advance(self, now: float = None):
+        """
+        Replace the shown notification with the next waiting one, if it was shown long
+        enough or was dismissed.
+        :param now: Current time (time.monotonic())
+        :return: The notification to show, or None
+        """
+        now = time.monotonic() if now is None else now
+        if self.pending and (self.current is None or self.wait_time(now) == 0):
+            self.current = self.pending.pop(0)
+            self.shown_at = now
+        return self.current
+
+    def wait_time(self, now: float = None):
+        """
+        :param now: Current time (time.monotonic())
+        :return: Seconds until advance() shows the next notification, or None if none is waiting
+        """
+        if not self.pending:
+            return None
+        if self.current is None:
+            return 0
+        now = time.monotonic() if now is None else now
+        return max(0, self.shown_at + self.min_display_time - now)
+
+    def dismiss(self):
+        """Remove the shown notification, so the next one can be shown right away."""
+        self.current = None
+        self.shown_at = None
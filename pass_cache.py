@@ -0,0 +1,180 @@
+import os
+import json
+import hashlib
+from datetime import datetime, timezone, timedelta
+from passes import Pass, Station, find_passes
+from myutils import parse_keplers, atomic_write
+
+# Default size cap of the cache directory
+MAX_BYTES = 16 * 1024 * 1024
+
+# Cached pass lists start at midnight (UTC) and cover at least this many days, so that
+# queries over the following days are served by slicing the same entry
+HORIZON_DAYS = 3
+
+
+def day_start(time: datetime) -> datetime:
+    """Midnight (UTC) at the start of the day of a time."""
+    return time.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def tle_key(line1: str, line2: str) -> str:
+    """Hash identifying one element set."""
+    return hashlib.sha256(f"{line1.strip()}\n{line2.strip()}".encode()).hexdigest()[:24]
+
+
+def station_key(station: Station, min_elevation: float) -> str:
+    """Hash identifying a station and the minimum elevation of its passes."""
+    text = f"{station.name}|{station.lat!r}|{station.lon!r}|{station.alt!r}|{min_elevation!r}"
+    return hashlib.sha256(text.encode()).hexdigest()[:24]
+
+
+# On-disk cache of predicted passes
+# =================================
+class PassCache:
+    def __init__(self, directory: str, max_bytes: int = MAX_BYTES,
+                 horizon_days: int = HORIZON_DAYS):
+        """
+        A cache of pass lists on disk, one file per (element set, station). Every entry
+        covers a horizon of whole days, and queries for any window inside it are answered
+        by slicing, so only new element sets need a prediction. File names start with the
+        hash of the element set, so the entries of a satellite can be invalidated when its
+        elements change. Hits refresh the file's modification time, which orders the least
+        recently used entries for eviction.
+        :param directory: Cache directory, created if missing
+        :param max_bytes: Size cap of all cache files together
+        :param horizon_days: Minimum number of days an entry covers
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.horizon_days = horizon_days
+        self._size = None  # Total size of cache files, determined on first write
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, line1, line2, station, min_elevation):
+        name = f"{tle_key(line1, line2)}-{station_key(station, min_elevation)}.json"
+        return os.path.join(self.directory, name)
+
+    def _entries(self):
+        """List of (modification time, size, path) of all cache files."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.json'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def get(self, line1, line2, station, min_elevation):
+        """
+        Look up the pass list of an element set over a station.
+        :return: (start, end, passes) of the covered horizon, or None on a cache miss
+        """
+        path = self._path(line1, line2, station, min_elevation)
+        try:
+            with open(path, 'r') as cache_file:
+                entry = json.load(cache_file)
+            os.utime(path)  # Mark as recently used
+            start, end = (datetime.fromisoformat(entry['start']),
+                          datetime.fromisoformat(entry['end']))
+            passes = [Pass(sat, sta, datetime.fromisoformat(aos), datetime.fromisoformat(tca),
+                           datetime.fromisoformat(los), max_el)
+                      for sat, sta, aos, tca, los, max_el in entry['passes']]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return start, end, passes
+
+    def put(self, line1, line2, station, min_elevation, start, end, passes):
+        """Store a pass list and evict least recently used entries beyond the size cap."""
+        path = self._path(line1, line2, station, min_elevation)
+        rows = [(p.satellite, p.station, p.aos.isoformat(), p.tca.isoformat(),
+                 p.los.isoformat(), p.max_elevation) for p in passes]
+        data = json.dumps({'start': start.isoformat(), 'end': end.isoformat(),
+                           'passes': rows}).encode()
+        try:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            atomic_write(path, data)
+        except OSError:
+            return
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += len(data) - old_size
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits its size cap."""
+        entries = sorted(self._entries())
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self._size -= size
+            except OSError:
+                pass
+
+    def passes(self, sat, name, line1, line2, station, start, hours=24, min_elevation=0):
+        """
+        Passes of a satellite over a station that are not over at the start of a window
+        and begin before its end. They are sliced from the cached pass list of the element
+        set, which is predicted again only if it does not cover the window.
+        :param sat: Satellite record for the element set
+        :param name: Satellite name
+        :param line1: First line of the element set
+        :param line2: Second line of the element set
+        :param station: Ground station
+        :param start: Start of the window (UTC)
+        :param hours: Length of the window
+        :param min_elevation: Minimum elevation of a pass (deg)
+        """
+        end = start + timedelta(hours=hours)
+        cached = self.get(line1, line2, station, min_elevation)
+        if cached is not None and cached[0] <= start and end <= cached[1]:
+            passes = cached[2]
+        else:
+            horizon_start = day_start(start)
+            days = max(self.horizon_days, -(-(end - horizon_start) // timedelta(days=1)))
+            horizon_end = horizon_start + timedelta(days=days)
+            passes = find_passes(sat, name, station, horizon_start,
+                                 (horizon_end - horizon_start).total_seconds() / 3600,
+                                 min_elevation)
+            self.put(line1, line2, station, min_elevation, horizon_start, horizon_end, passes)
+        return [p for p in passes if p.los > start and p.aos < end]
+
+    def _remove(self, keys) -> int:
+        """Delete all entries whose element set hash is in keys."""
+        removed = 0
+        for _, size, path in self._entries():
+            if os.path.basename(path).split('-', 1)[0] in keys:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                removed += 1
+                if self._size is not None:
+                    self._size -= size
+        return removed
+
+    def invalidate(self, line1: str, line2: str) -> int:
+        """
+        Delete all entries of an element set.
+        :return: Number of deleted entries
+        """
+        return self._remove({tle_key(line1, line2)})
+
+    def invalidate_changed(self, old_data: str, new_data: str) -> int:
+        """
+        Delete the entries of all satellites whose element sets changed or disappeared
+        between two versions of the Kepler data. Unchanged satellites keep their entries.
+        :param old_data: Replaced Kepler data
+        :param new_data: New Kepler data
+        :return: Number of deleted entries
+        """
+        new_keys = {tle_key(line1, line2) for _, line1, line2 in parse_keplers(new_data)}
+        old_keys = {tle_key(line1, line2) for _, line1, line2 in parse_keplers(old_data)}
+        stale = old_keys - new_keys
+        return self._remove(stale) if stale else 0
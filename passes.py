@@ -0,0 +1,320 @@
+import sys
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from multiprocessing import shared_memory, freeze_support
+import numpy as np
+from sgp4.api import Satrec, WGS72
+from myutils import is_keplers, parse_keplers
+
+# WGS84 ellipsoid
+EARTH_RADIUS = 6378.137  # km
+EARTH_FLATTENING = 1 / 298.257223563
+EARTH_ROTATION = 7.292115146706979e-5  # rad/s
+
+# Julian date of the SGP4 epoch reference (1949-12-31 00:00 UTC)
+JD_1950 = 2433281.5
+
+# Coarse time step of the pass search
+STEP = 30  # s
+
+# Columns of an element array, one row per satellite
+ELEMENTS = ('satnum', 'epoch', 'bstar', 'ndot', 'nddot', 'ecco',
+            'argpo', 'inclo', 'mo', 'no_kozai', 'nodeo')
+
+Station = namedtuple('Station', 'name lat lon alt')  # deg, deg, m
+Pass = namedtuple('Pass', 'satellite station aos tca los max_elevation')  # UTC datetimes, deg
+
+
+# Element arrays
+# ==============
+def element_array(tles) -> np.ndarray:
+    """
+    Parse element sets into a float array holding the SGP4 initialisation parameters.
+    :param tles: List of (name, line 1, line 2) tuples
+    :return: Array of shape (number of satellites, len(ELEMENTS))
+    """
+    elements = np.empty((len(tles), len(ELEMENTS)))
+    for i, (_, line1, line2) in enumerate(tles):
+        sat = Satrec.twoline2rv(line1, line2)
+        elements[i] = (sat.satnum, sat.jdsatepoch + sat.jdsatepochF - JD_1950, sat.bstar,
+                       sat.ndot, sat.nddot, sat.ecco, sat.argpo, sat.inclo, sat.mo,
+                       sat.no_kozai, sat.nodeo)
+    return elements
+
+
+def satrec_from_elements(row) -> Satrec:
+    """Initialise a satellite record from one row of an element array."""
+    sat = Satrec()
+    sat.sgp4init(WGS72, 'i', int(row[0]), *(float(value) for value in row[1:]))
+    return sat
+
+
+def satrecs(tles) -> list:
+    """Satellite records for a list of (name, line 1, line 2) tuples."""
+    return [Satrec.twoline2rv(line1, line2) for _, line1, line2 in tles]
+
+
+# Coordinates
+# ===========
+def time_grid(start: datetime, seconds: float, step: float = STEP):
+    """
+    Evenly spaced time grid as split julian dates, as expected by Satrec.sgp4_array().
+    :param start: Start of the grid (UTC)
+    :param seconds: Length of the grid
+    :param step: Spacing of the grid in seconds
+    :return: (whole julian days, fractions of day, seconds since start)
+    """
+    offsets = np.arange(0, seconds + step, step, dtype=float)
+    start = start.astimezone(timezone.utc)
+    midnight = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    jd = midnight.toordinal() + 1721424.5
+    fr = ((start - midnight).total_seconds() + offsets) / 86400
+    return np.full_like(fr, jd), fr, offsets
+
+
+def gmst(jd, fr):
+    """Greenwich mean sidereal time in radians (IAU-82) for split julian dates."""
+    t = (jd - 2451545.0 + fr) / 36525
+    seconds = 67310.54841 + (876600 * 3600 + 8640184.812866) * t \
+        + 0.093104 * t ** 2 - 6.2e-6 * t ** 3
+    return np.mod(np.radians(seconds / 240), 2 * np.pi)
+
+
+def station_ecef(station: Station) -> np.ndarray:
+    """Earth-fixed position of a station in km."""
+    lat, lon = np.radians(station.lat), np.radians(station.lon)
+    e2 = EARTH_FLATTENING * (2 - EARTH_FLATTENING)
+    n = EARTH_RADIUS / np.sqrt(1 - e2 * np.sin(lat) ** 2)
+    alt = station.alt / 1000
+    return np.array([(n + alt) * np.cos(lat) * np.cos(lon),
+                     (n + alt) * np.cos(lat) * np.sin(lon),
+                     (n * (1 - e2) + alt) * np.sin(lat)])
+
+
+def teme_to_ecef(r, jd, fr):
+    """Rotate TEME positions of shape (n, 3) into the earth-fixed frame."""
+    theta = gmst(jd, fr)
+    cos, sin = np.cos(theta), np.sin(theta)
+    return np.stack([cos * r[:, 0] + sin * r[:, 1],
+                     -sin * r[:, 0] + cos * r[:, 1],
+                     r[:, 2]], axis=1)
+
+
+def teme_to_ecef_velocity(r_ecef, v, jd, fr):
+    """
+    Rotate TEME velocities of shape (n, 3) into the earth-fixed frame.
+    :param r_ecef: Earth-fixed positions belonging to the velocities in km
+    :param v: TEME velocities in km/s
+    """
+    v_ecef = teme_to_ecef(v, jd, fr)
+    v_ecef[:, 0] += EARTH_ROTATION * r_ecef[:, 1]
+    v_ecef[:, 1] -= EARTH_ROTATION * r_ecef[:, 0]
+    return v_ecef
+
+
+def topocentric(r_ecef, station: Station):
+    """
+    Look angles of earth-fixed positions as seen from a station.
+    :param r_ecef: Earth-fixed positions of shape (n, 3) in km
+    :param station: Ground station
+    :return: (azimuth in deg, elevation in deg, range in km)
+    """
+    lat, lon = np.radians(station.lat), np.radians(station.lon)
+    rho = r_ecef - station_ecef(station)
+    east = -np.sin(lon) * rho[:, 0] + np.cos(lon) * rho[:, 1]
+    north = -np.sin(lat) * np.cos(lon) * rho[:, 0] - np.sin(lat) * np.sin(lon) * rho[:, 1] \
+        + np.cos(lat) * rho[:, 2]
+    up = np.cos(lat) * np.cos(lon) * rho[:, 0] + np.cos(lat) * np.sin(lon) * rho[:, 1] \
+        + np.sin(lat) * rho[:, 2]
+    rng = np.sqrt(east ** 2 + north ** 2 + up ** 2)
+    az = np.mod(np.degrees(np.arctan2(east, north)), 360)
+    el = np.degrees(np.arcsin(up / rng))
+    return az, el, rng
+
+
+def look_angles(sat: Satrec, station: Station, jd, fr):
+    """Azimuth, elevation (deg) and range (km) of a satellite for arrays of split julian dates."""
+    _, r, _ = sat.sgp4_array(jd, fr)
+    return topocentric(teme_to_ecef(r, jd, fr), station)
+
+
+# Pass prediction
+# ===============
+def find_passes(sat: Satrec, name: str, station: Station, start: datetime,
+                hours: float = 24, min_elevation: float = 0, step: float = STEP) -> list:
+    """
+    Predict the passes of a satellite over a station.
+    :param sat: Satellite record
+    :param name: Satellite name
+    :param station: Ground station
+    :param start: Start of the prediction window (UTC)
+    :param hours: Length of the prediction window
+    :param min_elevation: Elevation above which the satellite counts as visible (deg)
+    :param step: Time step of the search in seconds
+    :return: List of passes, sorted by AOS
+    """
+    jd, fr, offsets = time_grid(start, hours * 3600, step)
+    _, el, _ = look_angles(sat, station, jd, fr)
+    el = np.nan_to_num(el, nan=-90.0) - min_elevation
+
+    # Indices where the satellite rises above / falls below the threshold
+    above = el >= 0
+    edges = np.flatnonzero(np.diff(above.astype(np.int8)))
+    rises = list(edges[~above[edges]] + 1)
+    sets = list(edges[above[edges]])
+    if above[0]:
+        rises.insert(0, 0)
+    if above[-1]:
+        sets.append(len(el) - 1)
+
+    def crossing(i):
+        # Linear interpolation of the threshold crossing between grid points i - 1 and i
+        if i == 0 or i == len(el) or el[i] == el[i - 1]:
+            return offsets[min(i, len(el) - 1)]
+        return offsets[i - 1] + step * el[i - 1] / (el[i - 1] - el[i])
+
+    passes = []
+    for rise, fall in zip(rises, sets):
+        # Parabolic refinement of the culmination
+        peak = rise + int(np.argmax(el[rise:fall + 1]))
+        tca, max_el = offsets[peak], el[peak]
+        if 0 < peak < len(el) - 1:
+            a, b, c = el[peak - 1], el[peak], el[peak + 1]
+            denominator = a - 2 * b + c
+            if denominator < 0:
+                shift = 0.5 * (a - c) / denominator
+                tca += shift * step
+                max_el = b - 0.25 * (a - c) * shift
+
+        aos = crossing(rise) if rise > 0 else offsets[0]
+        los = crossing(fall + 1) if fall < len(el) - 1 else offsets[-1]
+        passes.append(Pass(name, station.name,
+                           start + timedelta(seconds=float(aos)),
+                           start + timedelta(seconds=float(tca)),
+                           start + timedelta(seconds=float(los)),
+                           float(max_el + min_elevation)))
+    return passes
+
+
+# Batch prediction over many stations
+# ===================================
+# Element array and satellite names of a worker process
+_worker_state = {}
+
+
+def _init_worker(shm_name, shape, names):
+    """Attach a worker process to the shared element array and build its satellite records."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    elements = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    _worker_state['shm'] = shm
+    _worker_state['names'] = names
+    _worker_state['sats'] = [satrec_from_elements(row) for row in elements]
+
+
+def _predict_task(station, index, start, hours, min_elevation):
+    """Predict the passes of one satellite over one station inside a worker process."""
+    sat, name = _worker_state['sats'][index], _worker_state['names'][index]
+    return find_passes(sat, name, station, start, hours, min_elevation)
+
+
+def predict_many(data: str, stations, start: datetime = None, hours: float = 24,
+                 min_elevation: float = 0, workers: int = None):
+    """
+    Predict the passes of all satellites in the Kepler data over many stations in parallel.
+    The parsed elements are shared with the worker processes through shared memory, and
+    the work is sharded into one task per (station, satellite) pair.
+    :param data: Kepler data in the 3-line TLE format
+    :param stations: Iterable of ground stations
+    :param start: Start of the prediction window (UTC), defaults to now
+    :param hours: Length of the prediction window
+    :param min_elevation: Minimum elevation of a pass (deg)
+    :param workers: Number of worker processes, defaults to the number of CPUs
+    :return: Generator of (station, passes sorted by AOS), in order of completion
+    """
+    if start is None:
+        start = datetime.now(timezone.utc)
+    stations = list(stations)
+    tles = parse_keplers(data)
+    names = [name for name, _, _ in tles]
+    elements = element_array(tles)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(elements.nbytes, 1))
+    try:
+        np.ndarray(elements.shape, dtype=np.float64, buffer=shm.buf)[:] = elements
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shm.name, elements.shape, names)) as executor:
+            # Stations are tracked by their index, equal stations may be listed twice
+            pending = [len(tles)] * len(stations)
+            results = [[] for _ in stations]
+            futures = {executor.submit(_predict_task, station, i, start, hours, min_elevation): s
+                       for s, station in enumerate(stations) for i in range(len(tles))}
+            for future in as_completed(futures):
+                s = futures[future]
+                results[s].extend(future.result())
+                pending[s] -= 1
+                if pending[s] == 0:
+                    yield stations[s], sorted(results[s], key=lambda p: p.aos)
+                    results[s] = None
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def parse_station(text: str) -> Station:
+    """
+    Parse a 'name, latitude, longitude, altitude' station definition.
+    Altitude is given in meters and may be omitted.
+    """
+    fields = [field.strip() for field in text.split(',')]
+    alt = float(fields[3]) if len(fields) > 3 else 0.0
+    return Station(fields[0], float(fields[1]), float(fields[2]), alt)
+
+
+def load_stations(path: str) -> list:
+    """
+    Load ground stations from a text file with one station definition per line.
+    :param path: Path of the stations file
+    """
+    stations = []
+    with open(path, 'r') as stations_file:
+        for line in stations_file:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                stations.append(parse_station(line))
+    return stations
+
+
+# Command line
+# ============
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Predict satellite passes over many ground"
+                                                 " stations from one Kepler data file.")
+    parser.add_argument('keplers', help="Kepler data file, e.g. weather.txt")
+    parser.add_argument('stations', help="file with one 'name, lat, lon, alt' line per station")
+    parser.add_argument('--hours', type=float, default=24, help="prediction window (default 24)")
+    parser.add_argument('--min-elevation', type=float, default=0,
+                        help="minimum elevation in degrees (default 0)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="number of worker processes (default: number of CPUs)")
+    args = parser.parse_args(argv)
+
+    with open(args.keplers, 'r') as keplers_file:
+        data = keplers_file.read()
+    if not is_keplers(data):
+        parser.error(f"{args.keplers} does not contain valid Kepler data")
+
+    for station, passes in predict_many(data, load_stations(args.stations), hours=args.hours,
+                                        min_elevation=args.min_elevation, workers=args.workers):
+        print(f"# {station.name}")
+        for p in passes:
+            print(f"{p.satellite:<24} {p.aos:%Y.%m.%d %H:%M:%S}  {p.los:%H:%M:%S}"
+                  f"  {p.max_elevation:5.1f}°")
+        sys.stdout.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    freeze_support()
+    sys.exit(main())
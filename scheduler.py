@@ -0,0 +1,233 @@
+import os
+import re
+import heapq
+import shlex
+import itertools
+import subprocess
+import threading
+from datetime import datetime, timezone, timedelta
+from passes import Satrec, find_passes
+from myutils import parse_keplers
+
+# Event kinds
+AOS, LOS, REPLAN = 'AOS', 'LOS', 'REPLAN'
+
+# Default prediction window per satellite, and how long before its end it is extended
+HOURS = 24
+REPLAN_MARGIN = timedelta(hours=1)
+
+# Characters of satellite names that are passed to hook commands, all others are replaced.
+# Names come from downloaded data, and batch files parse their arguments once more.
+UNSAFE_NAME_CHARS = re.compile(r"[^A-Za-z0-9 ()+\-./_]")
+
+
+def hook_command(template: str, p) -> list:
+    """
+    Argument list of a hook command. The template is split like a command line first and
+    the fields are filled into each argument, so the data of a pass never reaches a shell.
+    :param template: Command with the fields satellite, aos, los and max_elevation
+    :param p: Pass
+    """
+    fields = {'satellite': UNSAFE_NAME_CHARS.sub('_', p.satellite), 'aos': p.aos, 'los': p.los,
+              'max_elevation': round(p.max_elevation, 1)}
+    posix = os.name != 'nt'
+    args = shlex.split(template, posix=posix)
+    if not posix:
+        # Without POSIX rules quotes are kept, but backslashes of Windows paths are too
+        args = [arg[1:-1] if len(arg) > 1 and arg[0] == arg[-1] == '"' else arg for arg in args]
+    return [arg.format(**fields) for arg in args]
+
+
+# Pass event scheduler
+# ====================
+class PassScheduler:
+    def __init__(self, station, hours: float = HOURS, min_elevation: float = 0,
+                 hooks: dict = None, cache=None):
+        """
+        Fires callbacks and hook commands at the AOS and LOS of predicted passes.
+        Events are kept in a heap. When the Kepler data changes, only the satellites with
+        changed element sets are predicted again: their old events are marked stale by
+        bumping a per-satellite generation and dropped lazily when they reach the top.
+        :param station: Ground station
+        :param hours: Prediction window per satellite, extended automatically
+        :param min_elevation: Minimum elevation of a pass (deg)
+        :param hooks: Command templates by event kind ('AOS', 'LOS'), formatted with the
+                      fields satellite, aos, los and max_elevation
+        :param cache: PassCache to look up the passes of each window in, so plans for
+                      unchanged element sets are cache hits.
+        """
+        self.station = station
+        self.window = timedelta(hours=hours)
+        self.min_elevation = min_elevation
+        self.hooks = hooks or {}
+        self.cache = cache
+        self.callbacks = []
+
+        self._heap = []  # (time, sequence number, norad, generation, kind, pass)
+        self._counter = itertools.count()
+        self._sats = {}  # norad -> (name, line 1, line 2, satellite record)
+        self._generation = {}  # norad -> generation of its valid events
+        self._last_aos = {}  # norad -> AOS of the last scheduled pass
+        self._queued = {}  # norad -> number of its valid events in the heap
+        self._stale = 0  # number of stale events in the heap
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def add_callback(self, callback):
+        """Register a function called with (kind, pass) at every AOS and LOS."""
+        self.callbacks.append(callback)
+
+    # Scheduling
+    # ----------
+    def _push(self, time, norad, kind, p):
+        heapq.heappush(self._heap, (time, next(self._counter), norad,
+                                    self._generation[norad], kind, p))
+        self._queued[norad] = self._queued.get(norad, 0) + 1
+
+    def _find(self, norad, start):
+        """Passes of one satellite in the window from start, from the cache if there is one."""
+        name, line1, line2, sat = self._sats[norad]
+        hours = self.window.total_seconds() / 3600
+        if self.cache is None:
+            return find_passes(sat, name, self.station, start, hours, self.min_elevation)
+        return self.cache.passes(sat, name, line1, line2, self.station, start, hours,
+                                 self.min_elevation)
+
+    def _plan(self, norad, start):
+        """Push the events of one satellite from start to the end of its window."""
+        end = start + self.window
+        for p in self._find(norad, start):
+            # Passes cut off by the end of the window are found again by the next window
+            if p.los >= end:
+                continue
+            # Passes in progress at the start of a following window, or scheduled already
+            if norad in self._last_aos and (p.aos <= start or p.aos <= self._last_aos[norad]):
+                continue
+            self._push(p.aos, norad, AOS, p)
+            self._push(p.los, norad, LOS, p)
+            self._last_aos[norad] = p.aos
+        self._push(end - REPLAN_MARGIN, norad, REPLAN, None)
+
+    def update_elements(self, data: str, now: datetime = None, negligible=()) -> int:
+        """
+        Load new Kepler data and reschedule only satellites whose element sets changed.
+        Satellites whose drift is negligible keep their planned events, later passes are
+        planned from the new element sets.
+        :param data: Kepler data in the 3-line TLE format
+        :param now: Current time (UTC), defaults to now
+        :param negligible: NORAD numbers of satellites with negligible drift, see drift.summarize()
+        :return: Number of rescheduled satellites
+        """
+        if now is None:
+            now = datetime.now(timezone.utc)
+        new_sets = {line1[2:7].strip(): (name, line1, line2)
+                    for name, line1, line2 in parse_keplers(data)}
+        with self._condition:
+            changed = 0
+            for norad in list(self._sats):
+                if norad not in new_sets:
+                    self._invalidate(norad)
+                    del self._sats[norad]
+            for norad, (name, line1, line2) in new_sets.items():
+                old = self._sats.get(norad)
+                if old is not None and old[1:3] == (line1, line2):
+                    continue
+                satellite = (name, line1, line2, Satrec.twoline2rv(line1, line2))
+                if old is not None and norad in negligible:
+                    self._sats[norad] = satellite
+                    continue
+                self._invalidate(norad)
+                self._sats[norad] = satellite
+                self._last_aos.pop(norad, None)
+                self._plan(norad, now)
+                changed += 1
+            self._compact()
+            self._condition.notify()
+        return changed
+
+    def _invalidate(self, norad):
+        """Mark all queued events of a satellite as stale."""
+        self._stale += self._queued.pop(norad, 0)
+        self._generation[norad] = self._generation.get(norad, 0) + 1
+
+    def _compact(self):
+        """Rebuild the heap without stale events once they make up half of it."""
+        if self._stale * 2 < len(self._heap):
+            return
+        self._heap = [event for event in self._heap if self._valid(event)]
+        heapq.heapify(self._heap)
+        self._stale = 0
+
+    def _valid(self, event) -> bool:
+        return event[2] in self._sats and self._generation.get(event[2]) == event[3]
+
+    def pending(self) -> list:
+        """Valid upcoming (time, kind, pass) events, sorted by time."""
+        with self._condition:
+            return [(event[0], event[4], event[5]) for event in sorted(self._heap)
+                    if event[4] != REPLAN and self._valid(event)]
+
+    # Firing events
+    # -------------
+    def pop_due(self, now: datetime = None) -> list:
+        """
+        Remove and return all valid events that are due, extending satellite windows
+        whose end comes near.
+        :return: List of (kind, pass)
+        """
+        if now is None:
+            now = datetime.now(timezone.utc)
+        due = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                event = heapq.heappop(self._heap)
+                time, _, norad, _, kind, p = event
+                if not self._valid(event):
+                    self._stale -= 1
+                    continue
+                self._queued[norad] -= 1
+                if kind == REPLAN:
+                    self._plan(norad, time)
+                else:
+                    due.append((kind, p))
+        return due
+
+    def fire(self, kind, p):
+        """Call all callbacks and start the hook command of an event."""
+        for callback in self.callbacks:
+            try:
+                callback(kind, p)
+            except Exception:
+                pass
+        command = self.hooks.get(kind)
+        if command:
+            try:
+                subprocess.Popen(hook_command(command, p))
+            except (OSError, KeyError, ValueError, IndexError):
+                pass
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+                delay = None
+                if self._heap:
+                    delay = (self._heap[0][0] - datetime.now(timezone.utc)).total_seconds()
+                if delay is None or delay > 0:
+                    self._condition.wait(delay)
+                    continue
+            for kind, p in self.pop_due():
+                self.fire(kind, p)
+
+    def start(self):
+        """Fire events from a background thread."""
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
@@ -0,0 +1,138 @@
+from collections import namedtuple, defaultdict
+import numpy as np
+from passes import satrecs, station_ecef, teme_to_ecef, EARTH_FLATTENING
+
+# Lighting classes of a pass
+DAY, NIGHT, TERMINATOR = 'day', 'night', 'terminator'
+
+# Sun elevation at the sub-satellite point above / below which a whole pass counts as day / night
+DAY_ELEVATION = 5.0  # deg
+NIGHT_ELEVATION = -5.0  # deg
+
+# Sample spacing along a pass
+STEP = 30  # s
+
+# Sun elevations at the sub-satellite points and at the station during a pass (deg)
+PassLight = namedtuple('PassLight',
+                       'pass_ lighting subpoint_min subpoint_max station_min station_max')
+
+
+# Sun ephemeris
+# =============
+def sun_direction(times) -> np.ndarray:
+    """
+    Earth-fixed unit vectors towards the sun, from the low precision formulas of the
+    Astronomical Almanac (about 0.01 deg).
+    :param times: Array of unix timestamps
+    :return: Array of shape (len(times), 3)
+    """
+    days = np.asarray(times, dtype=float) / 86400
+    jd, fr = np.floor(days) + 2440587.5, days - np.floor(days)
+    n = jd - 2451545.0 + fr
+    mean_longitude = np.radians(280.460 + 0.9856474 * n)
+    anomaly = np.radians(357.528 + 0.9856003 * n)
+    longitude = mean_longitude + np.radians(1.915) * np.sin(anomaly) \
+        + np.radians(0.020) * np.sin(2 * anomaly)
+    obliquity = np.radians(23.439 - 4e-7 * n)
+    inertial = np.stack([np.cos(longitude),
+                         np.cos(obliquity) * np.sin(longitude),
+                         np.sin(obliquity) * np.sin(longitude)], axis=1)
+    return teme_to_ecef(inertial, jd, fr)
+
+
+class SunCache:
+    def __init__(self):
+        """
+        Sun directions computed once per minute and shared by all queries. Directions in
+        between are interpolated linearly, which is accurate to well below 0.01 deg.
+        """
+        self._minutes = {}  # unix minute -> earth-fixed unit vector
+
+    def directions(self, times) -> np.ndarray:
+        """
+        Earth-fixed unit vectors towards the sun.
+        :param times: Array of unix timestamps
+        :return: Array of shape (len(times), 3)
+        """
+        minutes = np.asarray(times, dtype=float) / 60
+        first = np.floor(minutes).astype(np.int64)
+        needed = np.unique(np.concatenate([first, first + 1]))
+        missing = [minute for minute in needed.tolist() if minute not in self._minutes]
+        if missing:
+            for minute, direction in zip(missing, sun_direction(np.array(missing) * 60.0)):
+                self._minutes[minute] = direction
+        lower = np.array([self._minutes[minute] for minute in first.tolist()])
+        upper = np.array([self._minutes[minute] for minute in (first + 1).tolist()])
+        f = (minutes - first)[:, None]
+        directions = lower + f * (upper - lower)
+        return directions / np.linalg.norm(directions, axis=1, keepdims=True)
+
+
+# Sun elevation
+# =============
+def surface_normal(r_ecef) -> np.ndarray:
+    """Geodetic up vectors below earth-fixed positions of shape (n, 3)."""
+    e2 = EARTH_FLATTENING * (2 - EARTH_FLATTENING)
+    lon = np.arctan2(r_ecef[:, 1], r_ecef[:, 0])
+    lat = np.arctan2(r_ecef[:, 2], np.hypot(r_ecef[:, 0], r_ecef[:, 1]) * (1 - e2))
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=1)
+
+
+def sun_elevation(normals, directions) -> np.ndarray:
+    """Sun elevation in degrees for up vectors and sun directions of shape (n, 3)."""
+    return np.degrees(np.arcsin(np.clip(np.einsum('ij,ij->i', normals, directions), -1, 1)))
+
+
+def classify(subpoint_elevations, day: float = DAY_ELEVATION,
+             night: float = NIGHT_ELEVATION) -> str:
+    """Lighting class of a pass from the sun elevations at its sub-satellite points."""
+    if np.min(subpoint_elevations) >= day:
+        return DAY
+    if np.max(subpoint_elevations) <= night:
+        return NIGHT
+    return TERMINATOR
+
+
+def classify_passes(tles, station, passes, cache: SunCache = None, step: float = STEP,
+                    day: float = DAY_ELEVATION, night: float = NIGHT_ELEVATION) -> list:
+    """
+    Tag passes as day, night or terminator passes. The samples of all passes of a
+    satellite are propagated in one call, and sun directions come from a shared cache.
+    :param tles: List of (name, line 1, line 2) tuples
+    :param station: Ground station
+    :param passes: Predicted passes of any of the satellites over the station
+    :param cache: Sun direction cache, shared between calls to reuse its work
+    :param step: Sample spacing along a pass in seconds
+    :param day: Minimum sun elevation at the sub-satellite point of a day pass (deg)
+    :param night: Maximum sun elevation at the sub-satellite point of a night pass (deg)
+    :return: List of PassLight tuples in the order of the passes
+    """
+    if cache is None:
+        cache = SunCache()
+    by_satellite = defaultdict(list)
+    for i, p in enumerate(passes):
+        by_satellite[p.satellite].append(i)
+    station_up = surface_normal(station_ecef(station)[None, :])[0]
+
+    lights = [None] * len(passes)
+    for (name, _, _), sat in zip(tles, satrecs(tles)):
+        indices = by_satellite.get(name)
+        if not indices:
+            continue
+        grids = [np.append(np.arange(passes[i].aos.timestamp(), passes[i].los.timestamp(), step),
+                           passes[i].los.timestamp()) for i in indices]
+        times = np.concatenate(grids)
+        days = times / 86400
+        jd, fr = np.floor(days) + 2440587.5, days - np.floor(days)
+        _, r, _ = sat.sgp4_array(jd, fr)
+        directions = cache.directions(times)
+        subpoint = sun_elevation(surface_normal(teme_to_ecef(r, jd, fr)), directions)
+        at_station = sun_elevation(np.broadcast_to(station_up, directions.shape), directions)
+
+        offset = 0
+        for i, grid in zip(indices, grids):
+            sub, sta = subpoint[offset:offset + len(grid)], at_station[offset:offset + len(grid)]
+            offset += len(grid)
+            lights[i] = PassLight(passes[i], classify(sub, day, night), float(sub.min()),
+                                  float(sub.max()), float(sta.min()), float(sta.max()))
+    return lights
@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+# Environment variable that puts the app into benchmark mode, see keplers_updater.py
+BENCHMARK_ENV_VAR = 'KEPLERS_UPDATER_BENCHMARK'
+
+# The source build finds icon.ico and the licenses relative to the working directory
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Default locations of the bundles built by bundle-to-dir.spec and bundle-to-exe.spec
+DIR_BUNDLE = os.path.join('dist', 'Kepler Updater', 'Keplers-Updater.exe')
+EXE_BUNDLE = os.path.join('dist', 'Keplers-Updater.exe')
+
+PERCENTILES = (10, 50, 90)
+
+
+def percentile(values, p: float) -> float:
+    """Percentile of a list of values, interpolated linearly between the closest ranks."""
+    values = sorted(values)
+    rank = (len(values) - 1) * p / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+def summarize(values) -> dict:
+    """Median, percentiles, minimum and maximum of a list of measurements."""
+    if not values:
+        return None
+    summary = {'median': percentile(values, 50)}
+    summary.update({f"p{p}": percentile(values, p) for p in PERCENTILES if p != 50})
+    summary.update({'min': min(values), 'max': max(values)})
+    return summary
+
+
+# Running the app
+# ===============
+def run_once(command, appdata: str, timeout: float) -> dict:
+    """
+    Start the app in benchmark mode and wait until it exits by itself.
+    :param command: Command line that starts the app
+    :param appdata: APPDATA directory for the app, so it starts without user settings
+    :param timeout: Seconds to wait for the app to exit
+    :return: Dict with the seconds from launch to the script start, the first paint and
+             the first idle, the seconds spent on loading the theme, and the peak RSS in bytes
+    """
+    fd, result_path = tempfile.mkstemp(prefix='ku-startup-', suffix='.json')
+    os.close(fd)
+    os.remove(result_path)
+    env = dict(os.environ, APPDATA=appdata)
+    env[BENCHMARK_ENV_VAR] = result_path
+    try:
+        launch = time.time()
+        subprocess.run(command, env=env, cwd=APP_DIR, timeout=timeout, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        with open(result_path, 'r') as result_file:
+            result = json.load(result_file)
+    finally:
+        if os.path.exists(result_path):
+            os.remove(result_path)
+
+    return {'script_start': result['script_start'] - launch,
+            'first_paint': result['first_paint'] - launch,
+            'idle': result['idle'] - launch,
+            'theme': result.get('theme'),
+            'peak_rss': result['peak_rss']}
+
+
+def benchmark(targets: dict, runs: int = 10, warmup: int = 1, timeout: float = 60) -> dict:
+    """
+    Measure the startup of several builds of the app. The runs of all builds are
+    interleaved, so that changing load on the machine affects all of them alike.
+    :param targets: Dict of build name -> command line
+    :param runs: Measured runs per build
+    :param warmup: Unmeasured runs per build before the measurement, to fill disk caches
+    :param timeout: Seconds to wait for one run
+    :return: Dict of build name -> {metric: summary}, with times in seconds
+    """
+    samples = {name: [] for name in targets}
+    with tempfile.TemporaryDirectory(prefix='ku-appdata-') as appdata:
+        for i in range(warmup + runs):
+            for name, command in targets.items():
+                result = run_once(command, appdata, timeout)
+                if i >= warmup:
+                    samples[name].append(result)
+
+    report = {}
+    for name, results in samples.items():
+        report[name] = {'runs': len(results)}
+        for metric in ('script_start', 'first_paint', 'idle', 'theme', 'peak_rss'):
+            values = [result[metric] for result in results if result[metric] is not None]
+            report[name][metric] = summarize(values)
+    return report
+
+
+# Command line
+# ============
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure time to first paint, time to idle and"
+                                                 " peak memory of the app at startup.")
+    parser.add_argument('--runs', type=int, default=10, help="measured runs per build (default 10)")
+    parser.add_argument('--warmup', type=int, default=1,
+                        help="unmeasured runs per build first (default 1)")
+    parser.add_argument('--timeout', type=float, default=60,
+                        help="seconds to wait for one run (default 60)")
+    parser.add_argument('--python', default=sys.executable,
+                        help="interpreter for the source build, e.g. the one start.bat uses")
+    parser.add_argument('--dir-bundle', default=DIR_BUNDLE,
+                        help=f"executable of the folder bundle (default {DIR_BUNDLE})")
+    parser.add_argument('--exe-bundle', default=EXE_BUNDLE,
+                        help=f"one-file bundle (default {EXE_BUNDLE})")
+    parser.add_argument('--output', default=None, help="JSON file for the report (default stdout)")
+    args = parser.parse_args(argv)
+
+    targets = {'source': [args.python, os.path.join(APP_DIR, 'keplers_updater.py')]}
+    for name, path in (('one-dir', args.dir_bundle), ('one-file', args.exe_bundle)):
+        if os.path.exists(path):
+            targets[name] = [os.path.abspath(path)]
+        else:
+            print(f"Skipping {name} build, {path} not found", file=sys.stderr)
+
+    report = benchmark(targets, args.runs, args.warmup, args.timeout)
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
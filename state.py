@@ -0,0 +1,103 @@
+import json
+from datetime import datetime, timezone
+from myutils import parse_keplers, atomic_write
+
+# Version of the snapshot layout, snapshots of other versions are ignored
+STATE_VERSION = 1
+
+# Number of upcoming passes kept in the snapshot
+PASS_COUNT = 10
+
+
+def build_state(data: str, source: str, digest: str, timings: dict = None,
+                passes: list = None, fetched: datetime = None, drift: dict = None) -> dict:
+    """
+    Snapshot of the last update, holding everything the main window shows at startup.
+    :param data: Kepler data in the 3-line TLE format
+    :param source: Where the data came from, e.g. its URL
+    :param digest: Content digest of the downloaded data, see blobstore.content_digest()
+    :param timings: Durations of the update steps in seconds and the downloaded bytes,
+                    e.g. {'head': 0.12, 'get': 0.34, 'bytes': 1234}
+    :param passes: Upcoming passes over the ground station, as returned by find_passes()
+    :param fetched: Time of the download (UTC), defaults to now
+    :param drift: Summary of the drift since the replaced data, as returned by drift.summarize()
+    :return: Dict that can be saved with save_state()
+    """
+    from tle_archive import norad_number, tle_epoch
+
+    fetched = fetched or datetime.now(timezone.utc)
+    passes = sorted(passes or [], key=lambda p: p.aos)[:PASS_COUNT]
+    return {'version': STATE_VERSION, 'source': source, 'digest': digest,
+            'fetched': fetched.timestamp(), 'timings': timings or {}, 'drift': drift,
+            'satellites': [{'name': name, 'norad': norad_number(line1), 'epoch': tle_epoch(line1)}
+                           for name, line1, _ in parse_keplers(data)],
+            'passes': [{'satellite': p.satellite, 'aos': p.aos.timestamp(),
+                        'los': p.los.timestamp(), 'max_elevation': p.max_elevation}
+                       for p in passes]}
+
+
+def save_state(path: str, state: dict):
+    atomic_write(path, json.dumps(state, separators=(',', ':')).encode())
+
+
+def load_state(path: str):
+    """
+    Read a snapshot saved by save_state().
+    :return: Snapshot dict, or None if there is no readable snapshot of this version
+    """
+    try:
+        with open(path, 'rb') as state_file:
+            state = json.loads(state_file.read())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(state, dict) or state.get('version') != STATE_VERSION:
+        return None
+    return state
+
+
+def describe_age(seconds: float) -> str:
+    days = seconds / 86400
+    if days >= 1:
+        return f"{days:.1f} days"
+    return f"{seconds / 3600:.0f} hours"
+
+
+def status_text(state: dict, now: datetime = None) -> str:
+    """
+    Human-friendly summary of a snapshot: the source, the age of the element sets,
+    the next pass and the drift of the last changed element sets.
+    :param state: Snapshot from load_state()
+    :param now: Current time (UTC), defaults to now
+    """
+    now = (now or datetime.now(timezone.utc)).timestamp()
+    lines = []
+
+    satellites = state.get('satellites', [])
+    if satellites:
+        ages = [now - satellite['epoch'] for satellite in satellites]
+        source = state.get('source', '').split('//')[-1].split('/')[0]
+        lines.append(f"{len(satellites)} satellites from {source}, element sets"
+                     f" {describe_age(min(ages))} to {describe_age(max(ages))} old")
+
+    upcoming = [p for p in state.get('passes', []) if p['los'] > now]
+    if upcoming:
+        p = upcoming[0]
+        aos = datetime.fromtimestamp(p['aos']).strftime('%H:%M')
+        lines.append(f"Next pass: {p['satellite']} at {aos}, max. elevation"
+                     f" {p['max_elevation']:.0f}°{' (in progress)' if p['aos'] <= now else ''}")
+
+    drift = state.get('drift')
+    if drift and drift['satellites']:
+        moved = drift['satellites'] - len(drift['negligible'])
+        line = f"Drift: {moved} of {drift['satellites']} satellites moved noticeably"
+        if drift['max_km'] is not None:
+            line += f", max. {drift['max_km']:.1f} km"
+        if drift['max_aos_shift'] is not None:
+            line += f", AOS shift max. {drift['max_aos_shift']:.0f} s"
+        lines.append(line)
+
+    timings = state.get('timings', {})
+    if 'get' in timings:
+        lines.append(f"Last download: {timings.get('bytes', 0) / 1024:.0f} KiB in"
+                     f" {timings['get']:.2f} s")
+    return "\n".join(lines)
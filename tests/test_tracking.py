@@ -0,0 +1,119 @@
+import os
+import sys
+import time
+import socket
+import threading
+import unittest
+import socketserver
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracking import PassTable, RotctldClient, Tracker, interpolate  # noqa: E402
+from passes import Station  # noqa: E402
+
+STATION = Station('station', 52.52, 13.40, 34)
+
+
+class StubRotctld(socketserver.ThreadingTCPServer):
+    """rotctld stand-in on a free local port, recording every received command."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, answer=True):
+        self.answer = answer
+        self.lines = []
+        self.connections = 0
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class StubHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.connections += 1
+        for line in self.rfile:
+            line = line.decode().strip()
+            if line == 'q':
+                return
+            self.server.lines.append(line)
+            if self.server.answer:
+                self.wfile.write(b"RPRT 0\n")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def constant_table(azimuth, elevation, start, seconds):
+    """Pass table holding one direction for the given time span."""
+    steps = int(seconds) + 2
+    return PassTable('TEST', start, 1.0, [azimuth] * steps, [elevation] * steps, [1000.0] * steps)
+
+
+class TestRotctldClient(unittest.TestCase):
+    def setUp(self):
+        self.server = StubRotctld()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_set_position(self):
+        client = RotctldClient('127.0.0.1', self.server.port)
+        try:
+            self.assertTrue(client.set_position(123.456, 10))
+            self.assertTrue(client.set_position(5, -3))  # below the horizon
+        finally:
+            client.close()
+        self.assertEqual(self.server.lines, ['P 123.46 10.00', 'P 5.00 0.00'])
+
+
+class TestTracker(unittest.TestCase):
+    def test_track_sends_interpolated_positions(self):
+        server = StubRotctld()
+        try:
+            start = time.time()
+            table = PassTable('TEST', start, 1.0, [350.0, 370.0, 390.0], [10.0, 20.0, 30.0],
+                              [1000.0] * 3)
+            tracker = Tracker(None, 'TEST', STATION, rate=20, port=server.port)
+            tracker.track_pass(table, start + 0.5)
+        finally:
+            server.stop()
+
+        self.assertGreaterEqual(len(server.lines), 8)
+        self.assertLessEqual(len(server.lines), 12)
+        for line in server.lines:
+            command, azimuth, elevation = line.split()
+            self.assertEqual(command, 'P')
+            self.assertTrue(0 <= float(azimuth) < 360)
+            self.assertTrue(10 <= float(elevation) <= 20)
+        self.assertEqual(interpolate(table, start + 1.5)[:2], (20.0, 25.0))
+
+    def test_no_rotctld(self):
+        start = time.time()
+        tracker = Tracker(None, 'TEST', STATION, rate=10, port=free_port())
+        tracker.track_pass(constant_table(90, 45, start, 1), start + 0.5)
+        self.assertLess(time.time() - start, 3)
+
+    def test_silent_rotctld_reconnects(self):
+        server = StubRotctld(answer=False)
+        try:
+            start = time.time()
+            tracker = Tracker(None, 'TEST', STATION, rate=10, port=server.port, timeout=0.2)
+            tracker.track_pass(constant_table(90, 45, start, 3), start + 1.5)
+        finally:
+            server.stop()
+        self.assertGreaterEqual(server.connections, 2)
+        self.assertTrue(all(line == 'P 90.00 45.00' for line in server.lines))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import asyncio
+import functools
+import queue
+import threading
+
+# Interval in which the Tk thread looks for finished coroutines (ms)
+POLL_INTERVAL = 50
+
+
+async def run_blocking(function, *args, **kwargs):
+    """
+    Run a blocking call, e.g. of requests, in the default thread pool of the running
+    event loop, so the loop is free for other coroutines while it waits.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(function, *args, **kwargs))
+
+
+# asyncio event loop next to the Tk mainloop
+# ==========================================
+class AsyncBridge:
+    def __init__(self, master, poll_interval: int = POLL_INTERVAL):
+        """
+        Runs an asyncio event loop in a background thread next to the Tk mainloop.
+        Coroutines are started from the Tk thread with run(), and their results are
+        passed to callbacks on the Tk thread, which polls for them with master.after.
+        Coroutines must not touch Tk themselves.
+        :param master: Root TK element
+        :param poll_interval: Interval in which finished coroutines are looked for (ms)
+        """
+        self.master = master
+        self.poll_interval = poll_interval
+        self.loop = asyncio.new_event_loop()
+        self._finished = queue.Queue()
+        self._running = 0
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro, callback=None, errback=None):
+        """
+        Start a coroutine on the event loop. Must be called from the Tk thread.
+        :param coro: Coroutine object
+        :param callback: Called on the Tk thread with the result of the coroutine
+        :param errback: Called on the Tk thread with the exception the coroutine raised.
+                        Without one, the exception is reported like one of a Tk callback.
+        :return: concurrent.futures.Future of the coroutine, e.g. to cancel it
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        future.add_done_callback(lambda f: self._finished.put((f, callback, errback)))
+        self._running += 1
+        if self._running == 1:
+            self.master.after(self.poll_interval, self._poll)
+        return future
+
+    def _poll(self):
+        """Pass the results of finished coroutines to their callbacks."""
+        try:
+            while True:
+                try:
+                    future, callback, errback = self._finished.get_nowait()
+                except queue.Empty:
+                    break
+                self._running -= 1
+                self._deliver(future, callback, errback)
+        finally:
+            if self._running:
+                self.master.after(self.poll_interval, self._poll)
+
+    def _deliver(self, future, callback, errback):
+        """
+        Call the callback or errback of a finished coroutine. Exceptions of the coroutine
+        without an errback, and those of the callbacks, are reported like ones of a Tk
+        callback, so they do not stop the delivery of other results.
+        """
+        if future.cancelled():
+            return
+        try:
+            error = future.exception()
+            if error is None:
+                if callback is not None:
+                    callback(future.result())
+                return
+            if errback is not None:
+                errback(error)
+                return
+        except Exception as callback_error:
+            error = callback_error
+        self.master.report_callback_exception(type(error), error, error.__traceback__)
+
+    def stop(self):
+        """Stop the event loop. Coroutines that are still running are abandoned."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
@@ -0,0 +1,199 @@
+import os
+import json
+import zlib
+import bisect
+import struct
+from datetime import datetime, timezone, timedelta
+from myutils import parse_keplers, atomic_write
+
+# Element sets per compressed segment
+SEGMENT_SIZE = 32
+
+# Index record: NORAD number, epoch (unix time), segment offset, segment length, slot in segment
+INDEX_RECORD = struct.Struct('<IdQIH')
+
+
+def norad_number(line1: str) -> int:
+    """NORAD catalog number of an element set."""
+    return int(line1[2:7])
+
+
+def tle_epoch(line1: str) -> float:
+    """Epoch of an element set as unix timestamp."""
+    year = int(line1[18:20])
+    year += 2000 if year < 57 else 1900
+    start = datetime(year, 1, 1, tzinfo=timezone.utc)
+    return (start + timedelta(days=float(line1[20:32]) - 1)).timestamp()
+
+
+def make_delta(previous: str, text: str) -> list:
+    """
+    Changes between two element sets as [position, replacement] runs.
+    Element sets of different length are stored whole as [-1, text].
+    """
+    if len(previous) != len(text):
+        return [[-1, text]]
+    delta = []
+    i = 0
+    while i < len(text):
+        if text[i] != previous[i]:
+            j = i
+            while j < len(text) and text[j] != previous[j]:
+                j += 1
+            delta.append([i, text[i:j]])
+            i = j
+        else:
+            i += 1
+    return delta
+
+
+def apply_delta(previous: str, delta: list) -> str:
+    """Rebuild an element set from its predecessor and a delta from make_delta()."""
+    text = list(previous)
+    for position, replacement in delta:
+        if position < 0:
+            return replacement
+        text[position:position + len(replacement)] = replacement
+    return ''.join(text)
+
+
+# Append-only TLE history archive
+# ===============================
+class TleArchive:
+    def __init__(self, directory: str, segment_size: int = SEGMENT_SIZE):
+        """
+        History of all element sets that were ever downloaded. Each satellite's sets are
+        collected in an open segment until it holds segment_size sets. The segment is then
+        compressed and appended to the segment file, storing the first set whole and every
+        other one as a delta against its predecessor. A sorted (NORAD, epoch) index points
+        into the segment file.
+        :param directory: Archive directory, created if missing
+        :param segment_size: Element sets per sealed segment
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self.segments_path = os.path.join(directory, 'segments.bin')
+        self.index_path = os.path.join(directory, 'index.bin')
+        self.open_path = os.path.join(directory, 'open.json')
+        os.makedirs(directory, exist_ok=True)
+
+        # Sorted index of sealed sets: keys (norad, epoch), values (offset, length, slot)
+        self._keys, self._values = [], []
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as index_file:
+                for norad, epoch, offset, length, slot in INDEX_RECORD.iter_unpack(
+                        index_file.read()):
+                    self._keys.append((norad, epoch))
+                    self._values.append((offset, length, slot))
+        # Length of segments.bin covered by the index, anything beyond is left over from an
+        # interrupted seal and is overwritten by the next one
+        self._sealed = max((offset + length for offset, length, _ in self._values), default=0)
+
+        # Open segments: norad -> list of [epoch, name, text]
+        self._open = {}
+        # Latest archived set per satellite: norad -> [epoch, name, text]
+        self._heads = {}
+        if os.path.exists(self.open_path):
+            with open(self.open_path, 'r') as open_file:
+                state = json.load(open_file)
+            self._heads = {int(norad): head for norad, head in state['heads'].items()}
+            # Records sealed right before an interruption are still open, drop them
+            for norad, records in state['open'].items():
+                records = [r for r in records if not self._is_indexed(int(norad), r[0])]
+                if records:
+                    self._open[int(norad)] = records
+
+    # Writing
+    # -------
+    def append(self, data: str) -> int:
+        """
+        Archive all element sets of the Kepler data that are not archived yet.
+        :param data: Kepler data in the 3-line TLE format
+        :return: Number of newly archived element sets
+        """
+        added = 0
+        sealed = []
+        for name, line1, line2 in parse_keplers(data):
+            norad, epoch = norad_number(line1), tle_epoch(line1)
+            text = f"{line1}\n{line2}"
+            head = self._heads.get(norad)
+            if head is not None and (head[2] == text or head[0] >= epoch):
+                continue
+            # Sealed before an interruption, while open.json still holds an older head
+            if self._is_indexed(norad, epoch):
+                continue
+            record = [epoch, name, text]
+            self._heads[norad] = record
+            self._open.setdefault(norad, []).append(record)
+            added += 1
+            if len(self._open[norad]) >= self.segment_size:
+                sealed.append(norad)
+
+        for norad in sealed:
+            self._seal(norad)
+        if sealed:
+            self._write_index()
+        if added:
+            state = {'open': self._open, 'heads': self._heads}
+            atomic_write(self.open_path, json.dumps(state).encode())
+        return added
+
+    def _seal(self, norad):
+        """Compress an open segment and append it to the segment file."""
+        records = self._open.pop(norad)
+        packed, previous = [], None
+        for epoch, name, text in records:
+            packed.append([epoch, name, text if previous is None else make_delta(previous, text)])
+            previous = text
+        blob = zlib.compress(json.dumps(packed, separators=(',', ':')).encode(), 9)
+
+        offset = self._sealed
+        with open(self.segments_path, 'ab') as segments_file:
+            segments_file.truncate(offset)
+            segments_file.write(blob)
+            segments_file.flush()
+            os.fsync(segments_file.fileno())
+        self._sealed = offset + len(blob)
+
+        for slot, (epoch, _, _) in enumerate(records):
+            i = bisect.bisect_right(self._keys, (norad, epoch))
+            self._keys.insert(i, (norad, epoch))
+            self._values.insert(i, (offset, len(blob), slot))
+
+    def _is_indexed(self, norad, epoch) -> bool:
+        i = bisect.bisect_left(self._keys, (norad, epoch))
+        return i < len(self._keys) and self._keys[i] == (norad, epoch)
+
+    def _write_index(self):
+        atomic_write(self.index_path, b''.join(
+            INDEX_RECORD.pack(norad, epoch, *value)
+            for (norad, epoch), value in zip(self._keys, self._values)))
+
+    # Reading
+    # -------
+    def lookup(self, norad: int, time: datetime):
+        """
+        Element set of a satellite that was active at a given time, i.e. the one with the
+        latest epoch before it.
+        :param norad: NORAD catalog number
+        :param time: Time (UTC)
+        :return: (name, line 1, line 2), or None if no set was archived before that time
+        """
+        t = time.timestamp()
+        open_records = self._open.get(norad, [])
+        if open_records and open_records[0][0] <= t:
+            record = open_records[bisect.bisect_right([r[0] for r in open_records], t) - 1]
+            return (record[1], *record[2].split('\n'))
+
+        i = bisect.bisect_right(self._keys, (norad, t)) - 1
+        if i < 0 or self._keys[i][0] != norad:
+            return None
+        offset, length, slot = self._values[i]
+        with open(self.segments_path, 'rb') as segments_file:
+            segments_file.seek(offset)
+            packed = json.loads(zlib.decompress(segments_file.read(length)))
+
+        text = packed[0][2]
+        for _, _, delta in packed[1:slot + 1]:
+            text = apply_delta(text, delta)
+        return (packed[slot][1], *text.split('\n'))
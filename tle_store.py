@@ -0,0 +1,134 @@
+import sqlite3
+from datetime import datetime, timezone
+from myutils import parse_keplers
+from tle_archive import norad_number, tle_epoch
+
+# Columns of the elements table, in insert order
+COLUMNS = ('norad', 'name', 'epoch', 'source', 'fetched', 'inclination', 'raan', 'eccentricity',
+           'argp', 'mean_anomaly', 'mean_motion', 'bstar', 'line1', 'line2')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS elements (
+    norad INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    epoch REAL NOT NULL,
+    source TEXT NOT NULL,
+    fetched REAL NOT NULL,
+    inclination REAL,
+    raan REAL,
+    eccentricity REAL,
+    argp REAL,
+    mean_anomaly REAL,
+    mean_motion REAL,
+    bstar REAL,
+    line1 TEXT NOT NULL,
+    line2 TEXT NOT NULL,
+    UNIQUE (norad, epoch, source)
+);
+CREATE INDEX IF NOT EXISTS elements_norad_epoch ON elements (norad, epoch);
+CREATE INDEX IF NOT EXISTS elements_source ON elements (source);
+"""
+
+
+def implied_decimal(field: str) -> float:
+    """Parse a TLE field in implied decimal notation, e.g. ' 12345-4' -> 0.12345e-4."""
+    field = field.strip()
+    if not field:
+        return 0.0
+    sign = -1.0 if field[0] == '-' else 1.0
+    field = field.lstrip('+-')
+    mantissa, exponent = field[:-2], field[-2:]
+    return sign * float(f"0.{mantissa}e{exponent}")
+
+
+def element_row(name: str, line1: str, line2: str, source: str, fetched: float) -> tuple:
+    """Row of the elements table for one element set."""
+    return (norad_number(line1), name, tle_epoch(line1), source, fetched,
+            float(line2[8:16]), float(line2[17:25]), float(f"0.{line2[26:33].strip()}"),
+            float(line2[34:42]), float(line2[43:51]), float(line2[52:63]),
+            implied_decimal(line1[53:61]), line1, line2)
+
+
+# SQLite TLE store
+# ================
+class TleStore:
+    def __init__(self, path: str):
+        """
+        Local SQLite database of element sets, indexed by satellite, epoch and source.
+        :param path: Path of the database file, created if missing
+        """
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def ingest(self, data: str, source: str, fetched: datetime = None) -> int:
+        """
+        Insert all element sets of the Kepler data in one transaction. Sets already stored
+        for the same satellite, epoch and source are ignored.
+        :param data: Kepler data in the 3-line TLE format
+        :param source: Where the data came from, e.g. its URL
+        :param fetched: Time of the download (UTC), defaults to now
+        :return: Number of inserted element sets
+        """
+        fetched = (fetched or datetime.now(timezone.utc)).timestamp()
+        rows = [element_row(name, line1, line2, source, fetched)
+                for name, line1, line2 in parse_keplers(data)]
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(f"INSERT OR IGNORE INTO elements ({', '.join(COLUMNS)})"
+                                  f" VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+            return self.conn.total_changes - before
+
+    def query(self, norad: int = None, start: datetime = None, end: datetime = None,
+              source: str = None, columns=COLUMNS) -> dict:
+        """
+        Select element sets, ordered by satellite and epoch.
+        :param norad: NORAD catalog number, all satellites if None
+        :param start: Earliest epoch (UTC)
+        :param end: Latest epoch (UTC)
+        :param source: Source of the data
+        :param columns: Columns to return
+        :return: Dict of column name -> NumPy array (or list, without NumPy)
+        """
+        unknown = set(columns) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+        conditions, parameters = [], []
+        if norad is not None:
+            conditions.append("norad = ?")
+            parameters.append(norad)
+        if start is not None:
+            conditions.append("epoch >= ?")
+            parameters.append(start.timestamp())
+        if end is not None:
+            conditions.append("epoch <= ?")
+            parameters.append(end.timestamp())
+        if source is not None:
+            conditions.append("source = ?")
+            parameters.append(source)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.conn.execute(f"SELECT {', '.join(columns)} FROM elements{where}"
+                                 f" ORDER BY norad, epoch", parameters).fetchall()
+        values = list(zip(*rows)) if rows else [()] * len(columns)
+
+        try:
+            import numpy as np
+        except ImportError:
+            return {column: list(value) for column, value in zip(columns, values)}
+        return {column: np.array(value) for column, value in zip(columns, values)}
+
+    def latest(self, norad: int, time: datetime = None):
+        """
+        Element set of a satellite with the latest epoch up to a given time.
+        :param norad: NORAD catalog number
+        :param time: Time (UTC), defaults to now
+        :return: (name, line 1, line 2), or None
+        """
+        time = (time or datetime.now(timezone.utc)).timestamp()
+        return self.conn.execute("SELECT name, line1, line2 FROM elements WHERE norad = ?"
+                                 " AND epoch <= ? ORDER BY epoch DESC LIMIT 1",
+                                 (norad, time)).fetchone()
@@ -0,0 +1,212 @@
+import sys
+import time
+import socket
+import argparse
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+import numpy as np
+from passes import Station, satrecs, find_passes, look_angles, time_grid
+from myutils import is_keplers, parse_keplers
+
+# Default rotctld address
+ROTCTLD_HOST = '127.0.0.1'
+ROTCTLD_PORT = 4533
+
+# Socket timeout of rotctld commands, and the wait before reconnecting after an error (s)
+TIMEOUT = 2
+RECONNECT_DELAY = 1
+
+# Allowed tracking rates (Hz) and spacing of the precomputed pass tables (s)
+MIN_RATE, MAX_RATE = 1, 20
+TABLE_STEP = 1.0
+
+# Look angles of one pass on an even time grid, azimuth unwrapped for interpolation
+PassTable = namedtuple('PassTable', 'satellite start step azimuth elevation range')
+
+
+# Pass tables
+# ===========
+def pass_table(sat, station: Station, p, step: float = TABLE_STEP) -> PassTable:
+    """
+    Precompute the look angles of a pass.
+    :param sat: Satellite record
+    :param station: Ground station
+    :param p: Predicted pass
+    :param step: Spacing of the table in seconds
+    """
+    jd, fr, _ = time_grid(p.aos, (p.los - p.aos).total_seconds() + step, step)
+    az, el, rng = look_angles(sat, station, jd, fr)
+    return PassTable(p.satellite, p.aos.timestamp(), step,
+                     np.degrees(np.unwrap(np.radians(az))).tolist(), el.tolist(), rng.tolist())
+
+
+def interpolate(table: PassTable, t: float):
+    """
+    Look angles at a unix timestamp by linear interpolation in a pass table.
+    :return: (azimuth in deg, elevation in deg, range in km)
+    """
+    x = (t - table.start) / table.step
+    i = min(max(int(x), 0), len(table.elevation) - 2)
+    f = min(max(x - i, 0.0), 1.0)
+    az = table.azimuth[i] + f * (table.azimuth[i + 1] - table.azimuth[i])
+    el = table.elevation[i] + f * (table.elevation[i + 1] - table.elevation[i])
+    rng = table.range[i] + f * (table.range[i + 1] - table.range[i])
+    return az % 360, el, rng
+
+
+# rotctld client
+# ==============
+class RotctldClient:
+    def __init__(self, host: str = ROTCTLD_HOST, port: int = ROTCTLD_PORT,
+                 timeout: float = TIMEOUT):
+        """
+        Minimal client for the rotctld text protocol of Hamlib.
+        :param host: Host of rotctld
+        :param port: TCP port of rotctld
+        :param timeout: Socket timeout in seconds
+        """
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('r')
+
+    def set_position(self, azimuth: float, elevation: float) -> bool:
+        """
+        Send a set_pos command.
+        :return: Whether rotctld acknowledged it with 'RPRT 0'
+        """
+        self.sock.sendall(f"P {azimuth:.2f} {max(elevation, 0.0):.2f}\n".encode())
+        return self.reader.readline().strip() == 'RPRT 0'
+
+    def close(self):
+        try:
+            self.sock.sendall(b"q\n")
+        except OSError:
+            pass
+        self.reader.close()
+        self.sock.close()
+
+
+# Tracking service
+# ================
+class Tracker:
+    def __init__(self, sat, name: str, station: Station, rate: float = 10,
+                 host: str = ROTCTLD_HOST, port: int = ROTCTLD_PORT, min_elevation: float = 0,
+                 timeout: float = TIMEOUT):
+        """
+        Feeds the look angles of a satellite to rotctld during its passes.
+        Angles are interpolated in precomputed pass tables, so a tick costs no propagation.
+        If rotctld is not running or stops answering, the tracker reconnects until the
+        end of the pass.
+        :param sat: Satellite record
+        :param name: Satellite name
+        :param station: Ground station
+        :param rate: Updates per second, between MIN_RATE and MAX_RATE
+        :param host: Host of rotctld
+        :param port: TCP port of rotctld
+        :param min_elevation: Minimum elevation of a tracked pass (deg)
+        :param timeout: Socket timeout of rotctld commands in seconds
+        """
+        if not MIN_RATE <= rate <= MAX_RATE:
+            raise ValueError(f"Rate must be between {MIN_RATE} and {MAX_RATE} Hz")
+        self.sat = sat
+        self.name = name
+        self.station = station
+        self.period = 1 / rate
+        self.host, self.port = host, port
+        self.min_elevation = min_elevation
+        self.timeout = timeout
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def track(self, table: PassTable, end: float, client: RotctldClient):
+        """Send look angles until the end of a pass, on a fixed grid of deadlines."""
+        tick = 0
+        start = max(time.time(), table.start)
+        while not self.stop_event.is_set():
+            # Deadlines are absolute, so late ticks do not delay the following ones
+            deadline = start + tick * self.period
+            if deadline > end:
+                break
+            delay = deadline - time.time()
+            if delay > 0 and self.stop_event.wait(delay):
+                break
+            az, el, _ = interpolate(table, deadline)
+            client.set_position(az, el)
+            tick += 1
+
+    def track_pass(self, table: PassTable, end: float):
+        """Track one pass, reconnecting to rotctld after connection errors until its end."""
+        while not self.stop_event.is_set() and time.time() < end:
+            try:
+                client = RotctldClient(self.host, self.port, self.timeout)
+            except OSError as err:
+                print(f"Can not connect to rotctld: {err}", file=sys.stderr)
+            else:
+                try:
+                    self.track(table, end, client)
+                    return
+                except OSError as err:
+                    print(f"Connection to rotctld lost: {err}", file=sys.stderr)
+                finally:
+                    client.close()
+            if self.stop_event.wait(RECONNECT_DELAY):
+                return
+
+    def run(self, hours: float = 24):
+        """Track all passes within the next hours, or until stop() is called."""
+        start = datetime.now(timezone.utc)
+        for p in find_passes(self.sat, self.name, self.station, start, hours, self.min_elevation):
+            if p.los <= datetime.now(timezone.utc):
+                continue
+            table = pass_table(self.sat, self.station, p)
+            if self.stop_event.wait(max(0.0, p.aos.timestamp() - time.time())):
+                return
+            self.track_pass(table, p.los.timestamp())
+            if self.stop_event.is_set():
+                return
+
+
+# Command line
+# ============
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Steer an antenna rotator through rotctld"
+                                                 " along the passes of a satellite.")
+    parser.add_argument('keplers', help="Kepler data file, e.g. weather.txt")
+    parser.add_argument('satellite', help="satellite name, e.g. 'NOAA 19'")
+    parser.add_argument('--lat', type=float, required=True, help="station latitude in degrees")
+    parser.add_argument('--lon', type=float, required=True, help="station longitude in degrees")
+    parser.add_argument('--alt', type=float, default=0, help="station altitude in meters")
+    parser.add_argument('--rate', type=float, default=10,
+                        help=f"updates per second, {MIN_RATE}-{MAX_RATE} (default 10)")
+    parser.add_argument('--min-elevation', type=float, default=0,
+                        help="minimum elevation in degrees (default 0)")
+    parser.add_argument('--host', default=ROTCTLD_HOST, help=f"rotctld host ({ROTCTLD_HOST})")
+    parser.add_argument('--port', type=int, default=ROTCTLD_PORT,
+                        help=f"rotctld port ({ROTCTLD_PORT})")
+    args = parser.parse_args(argv)
+
+    with open(args.keplers, 'r') as keplers_file:
+        data = keplers_file.read()
+    if not is_keplers(data):
+        parser.error(f"{args.keplers} does not contain valid Kepler data")
+    tles = [tle for tle in parse_keplers(data) if tle[0] == args.satellite]
+    if not tles:
+        parser.error(f"{args.satellite} is not in {args.keplers}")
+    if not MIN_RATE <= args.rate <= MAX_RATE:
+        parser.error(f"--rate must be between {MIN_RATE} and {MAX_RATE}")
+
+    station = Station('station', args.lat, args.lon, args.alt)
+    tracker = Tracker(satrecs(tles)[0], args.satellite, station, args.rate,
+                      args.host, args.port, args.min_elevation)
+    try:
+        tracker.run()
+    except KeyboardInterrupt:
+        tracker.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())